@@ -1,84 +1,125 @@
-from operator import index
-import pandas as pd
-import pandas_ta as ta
 import numpy as np
-from database import StockData
+import kernels
+from cache import frame_cache
+from instrument import timer
 
 
 class Indicator:
-    def __init__(self, stock_c):
+    def __init__(self, stock_c, lookback=None):
         self.stock_c = stock_c
         self.directory = f"datafolder/{stock_c}.csv"
+        self.lookback = lookback  # Number of most recent bars to work on; None means the full history
 
     def load_data(self):
-        # Load stock data from CSV file
-        df = pd.read_csv(self.directory)
-        df[["Close", "High", "Low", "Open", "Volume"]] = df[["Close", "High", "Low", "Open", "Volume"]].apply(pd.to_numeric, errors='coerce')
+        # Load stock data through the shared cache, so the CSV is parsed once per change
+        if self.lookback:
+            return frame_cache.load_tail(self.stock_c, self.lookback)
+        return frame_cache.load(self.stock_c)
+
+    def compute(self, spec, df=None):
+        # Every series in spec from a single load of the data, added as columns to the price frame, e.g.
+        # {"SMA": [50, 200], "EMA": [12, 26], "RSI": 14, "MACD": True, "Bollinger": True}.
+        # Columns: SMA50, EMA12, RSI14, ADX14, REL_VOL10, MACD, MACD_SIGNAL, HISTOGRAM, BB_MID, BB_UPPER,
+        # BB_LOWER and CROSS. Moving averages shared between outputs (SMA20 and the Bollinger middle band,
+        # EMA12/26 and MACD, SMA50/200 and CROSS) are computed once. Pass df to add to an already loaded frame.
+        df = (self.load_data() if df is None else df).copy()
+        with timer("indicator", self.stock_c):
+            return self._compute(spec, df)
+
+    def _compute(self, spec, df):
+        close = df["Close"].to_numpy()
+        sma = {}
+        ema = {}
+
+        def sma_of(period):
+            if period not in sma:
+                sma[period] = kernels.sma(close, period)
+            return sma[period]
+
+        def ema_of(period):
+            if period not in ema:
+                ema[period] = kernels.ema(close, period)
+            return ema[period]
+
+        for name, value in spec.items():
+            if not value:
+                continue
+            periods = value if isinstance(value, list) else [value]
+            if name == "SMA":
+                for period in periods:
+                    df[f"SMA{period}"] = sma_of(period)
+            elif name == "EMA":
+                for period in periods:
+                    df[f"EMA{period}"] = ema_of(period)
+            elif name == "RSI":
+                for period in periods:
+                    df[f"RSI{period}"] = kernels.rsi(close, period)
+            elif name == "ADX":
+                for period in periods:
+                    df[f"ADX{period}"] = kernels.adx(df["High"].to_numpy(), df["Low"].to_numpy(), close, period)[0]
+            elif name == "REL_VOL":
+                for period in periods:
+                    df[f"REL_VOL{period}"] = kernels.relative_volume(df["Volume"].to_numpy(), period)
+            elif name == "MACD":
+                # MACD line (12-day EMA - 26-day EMA), its 9-day EMA signal line and the histogram between them
+                line = ema_of(12) - ema_of(26)
+                signal = kernels.ema(line, 9)
+                df["MACD"], df["MACD_SIGNAL"], df["HISTOGRAM"] = line, signal, line - signal
+            elif name == "Bollinger":
+                std = kernels.rolling_std(close, 20)
+                df["BB_MID"], df["BB_UPPER"], df["BB_LOWER"] = sma_of(20), sma_of(20) + 2 * std, sma_of(20) - 2 * std
+            elif name == "CROSS":
+                df["SMA50"], df["SMA200"] = sma_of(50), sma_of(200)
+                df["CROSS"] = np.where(df["SMA50"] > df["SMA200"], "Golden Cross", "Death Cross")
+            else:
+                raise ValueError(f"Unsupported indicator: {name}")
         return df
 
     def sma_indicator(self, period):
         # Calculate Simple Moving Average (SMA)
         df = self.load_data()
         if len(df) >= period:
-            sma = df['Close'].rolling(window=period).mean()
-            return sma
+            return self.compute({"SMA": period}, df)[f"SMA{period}"]
 
     def ema_indicator(self, period):
         # Calculate Exponential Moving Average (EMA)
         df = self.load_data()
         if len(df) >= period:
-            ema = df['Close'].ewm(span=period, adjust=False).mean()
-            return ema
+            return self.compute({"EMA": period}, df)[f"EMA{period}"]
 
     def rsi_indicator(self, period=14):
         # Calculate Relative Strength Index (RSI)
         df = self.load_data()
         if len(df) >= period:
-            rsi = ta.rsi(df["Close"], period)
-            return rsi
+            return self.compute({"RSI": period}, df)[f"RSI{period}"]
 
     def adx_indicator(self, period=14):
         # Calculate Average Directional Index (ADX)
         df = self.load_data()
         if len(df) >= period:
-            cols = ["Close", "High", "Low"]
-            df[cols] = df[cols].apply(pd.to_numeric, errors='coerce')
-            adx = ta.trend.adx(df['High'], df['Low'], df['Close'], window=period)
-            return adx["ADX_14"]
+            return self.compute({"ADX": period}, df)[f"ADX{period}"]
 
     def relative_vol(self, period=10):
         # Calculate Relative Volume compared to its moving average
         df = self.load_data()
         if len(df) >= period:
-            df["average_vol"] = df["Volume"].rolling(window=period).mean()
-            df["relative_vol"] = df["Volume"] / df["average_vol"]
-            return df["relative_vol"]
+            return self.compute({"REL_VOL": period}, df)[f"REL_VOL{period}"]
 
     def golden_dead_cross(self):
         # Detect Golden Cross and Death Cross using SMA(50) and SMA(200)
         df = self.load_data()
         if len(df) > 200:
-            df["sma50"] = self.sma_indicator(50)
-            df["sma200"] = self.sma_indicator(200)
-
-            df["Cross"] = np.where(df["sma50"] > df["sma200"], "Golden Cross", "Death Cross")
-
-            cross_signals = df[["Date", "sma50", "sma200", "Cross"]]
-            return cross_signals
+            df = self.compute({"CROSS": True}, df)
+            cross_signals = df[["Date", "SMA50", "SMA200", "CROSS"]]
+            return cross_signals.rename(columns={"SMA50": "sma50", "SMA200": "sma200", "CROSS": "Cross"})
 
     def macd_indicator(self):
         # Load stock data
         df = self.load_data()
 
         if len(df) > 26:
-            df["ema12"] = self.ema_indicator(12) # Calculate 12-day EMA (short-term trend)
-            df["ema26"] = self.ema_indicator(26) # Calculate 26-day EMA (long-term trend)
-
-            df["macd"] = df["ema12"] - df["ema26"] # MACD line: Difference between 12-day EMA and 26-day EMA
-
-            df["macd_signal"] = df["macd"].ewm(span=9, adjust=False).mean() # Signal line: 9-day EMA of the MACD line
-
-            df["histogram"] = df["macd"] - df["macd_signal"]             # Histogram: Difference between MACD line and Signal line
+            df = self.compute({"MACD": True}, df)
+            df = df.rename(columns={"MACD": "macd", "MACD_SIGNAL": "macd_signal", "HISTOGRAM": "histogram"})
 
             df["signal"] = np.where(df["histogram"] > 0, "Positive Signal", "Negative Signal") # Generate buy/sell signals based on histogram values
 
@@ -88,11 +129,7 @@ class Indicator:
         # Calculate Bollinger Bands (Upper, Lower, and Middle Bands)
         df = self.load_data()
         if len(df) >= 20:
-            df["mid_band"] = self.sma_indicator(20)
-
-            df["standard_dev"] = df['Close'].rolling(window=20).std()
-
-            df["upper_band"] = df["mid_band"] + (2 * df["standard_dev"])
-            df["lower_band"] = df["mid_band"] - (2 * df["standard_dev"])
+            df = self.compute({"Bollinger": True}, df)
+            df = df.rename(columns={"BB_MID": "mid_band", "BB_UPPER": "upper_band", "BB_LOWER": "lower_band"})
 
             return df[['Close', "mid_band", "upper_band", "lower_band"]]
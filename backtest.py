@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from conditions import compile_conditions, min_bars
+from fundamentals import fundamentals_store
+from panel import Panel, evaluate
+from instrument import timer
+
+# Holding periods in bars that forward returns are measured over by default
+HORIZONS = (1, 5, 20)
+
+
+def signal_mask(plan, panel, start=None, end=None, entries_only=False):
+    # bars x symbols booleans: True where every condition of the plan holds at that bar, as a scan run
+    # on that date would have answered. Each TA condition is one comparison over the whole panel (no
+    # loop over dates), and a cell only counts once the symbol has the bars its operands need.
+    # entries_only keeps just the first bar of each run of consecutive signals.
+    bars = len(panel.close)
+    # Bars of history each cell has, itself included (histories are right-aligned, see Panel)
+    available = np.arange(1, bars + 1)[:, None] - (bars - panel.lengths)[None, :]
+    mask = available >= 1
+
+    with timer("backtest.signals"):
+        for condition, keys in plan.steps:
+            if keys is None:
+                continue
+            operands = [panel.operand(key) for key in keys]
+            need = max([min_bars(key) for key in keys if key[0] not in ("value", "last_price")] or [1])
+            with np.errstate(invalid="ignore"):
+                mask &= evaluate(condition, *operands) & (available >= need)
+
+        fa_conditions = [condition for condition, keys in plan.steps if keys is None]
+        if fa_conditions:
+            # There is no history of fundamentals, so every date is checked against today's values
+            print("FA conditions are applied with the current fundamentals on every date (look-ahead).")
+            mask &= fundamentals_store.filter(fa_conditions, panel.symbols).to_numpy()[None, :]
+
+        # Runs are found before the date window is applied, so a run already going at `start` isn't an entry
+        if entries_only:
+            mask[1:] &= ~mask[:-1].copy()
+        if start is not None:
+            mask &= panel.date >= np.datetime64(pd.Timestamp(start))
+        if end is not None:
+            mask &= panel.date < np.datetime64(pd.Timestamp(end))
+    return mask
+
+
+def forward_paths(close, horizon):
+    # (return, drawdown) arrays shaped like close: the return from each bar's close to the close
+    # `horizon` bars later, and the deepest fall below the entry close over those bars (<= 0).
+    # Both are NaN where the window runs past the symbol's last bar.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = np.full_like(close, np.nan)
+        returns[:-horizon] = close[horizon:] / close[:-horizon] - 1
+        # Lowest close of bars t+1 .. t+horizon: a trailing rolling minimum of the reversed history
+        lowest = pd.DataFrame(close[::-1]).rolling(horizon, min_periods=horizon).min().to_numpy()[::-1]
+        drawdown = np.full_like(close, np.nan)
+        drawdown[:-1] = np.minimum(lowest[1:] / close[:-1] - 1, 0)
+        drawdown[np.isnan(returns)] = np.nan
+    return returns, drawdown
+
+
+def backtest(conditions, symbols=None, horizons=HORIZONS, start=None, end=None, entries_only=False,
+             panel=None, store=None):
+    # Evaluate a condition list (the same dicts Scan.scan takes) on every bar of every symbol and
+    # measure what followed each signal. Entries are at the close of the signal bar.
+    # Returns {"summary": one row per horizon (signals, mean/median return, hit rate, mean and worst
+    # drawdown, and the mean return over all bars for comparison), "trades": one row per signal}.
+    plan = compile_conditions(conditions)
+    if panel is None:
+        panel = Panel(symbols, store=store)
+    if not len(panel.symbols):
+        print("No price data to backtest.")
+        return {"summary": pd.DataFrame(), "trades": pd.DataFrame()}
+
+    mask = signal_mask(plan, panel, start, end, entries_only)
+    rows, cols = np.nonzero(mask)
+    trades = {"Symbol": np.asarray(panel.symbols, dtype=object)[cols], "Date": panel.date[rows, cols],
+              "Close": panel.close[rows, cols]}
+    summary = []
+    with timer("backtest.returns"):
+        for horizon in horizons:
+            returns, drawdown = forward_paths(panel.close, horizon)
+            ret, dd = returns[rows, cols], drawdown[rows, cols]
+            trades[f"return_{horizon}"] = ret
+            trades[f"drawdown_{horizon}"] = dd
+            done = ~np.isnan(ret)
+            summary.append({
+                "horizon": horizon,
+                "signals": int(done.sum()),
+                "mean_return": ret[done].mean() if done.any() else np.nan,
+                "median_return": np.median(ret[done]) if done.any() else np.nan,
+                "hit_rate": (ret[done] > 0).mean() if done.any() else np.nan,
+                "mean_drawdown": dd[done].mean() if done.any() else np.nan,
+                "worst_drawdown": dd[done].min() if done.any() else np.nan,
+                "all_bars_mean_return": np.nanmean(returns) if np.isfinite(returns).any() else np.nan,
+            })
+
+    trades = pd.DataFrame(trades).sort_values(["Date", "Symbol"], ignore_index=True)
+    return {"summary": pd.DataFrame(summary).set_index("horizon"), "trades": trades}
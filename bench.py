@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Offline benchmark: a deterministic synthetic universe is written to a temporary folder, which becomes
+# the working directory for the run, so the default ./datafolder and fundamentals file point at it and
+# nothing is downloaded. Results are printed (or written) as JSON to compare between commits.
+
+CONDITIONS = [
+    {"type": "fa", "financial ratio": "PE", "condition": "<", "con_v1": 25},
+    {"type": "ta", "indicator": "ema", "case": 5, "condition": ">", "con_v1": 20},
+    {"type": "ta", "indicator": "rsi", "condition": "between", "con_v1": 30, "con_v2": 70},
+    {"type": "ta", "indicator": "rel_vol", "condition": ">", "con_v1": 0.5},
+    {"type": "ta", "indicator": "adx", "condition": ">", "con_v1": 10},
+]
+CHART_INDICATORS = {"SMA": [50, 200], "EMA": [20], "RSI": 14, "ADX": 14, "MACD": True, "Bollinger": True}
+END_DATE = "2025-01-01"  # Fixed, so the same arguments always give the same data
+
+
+def synthetic_prices(index, years, seed=0):
+    # One symbol's daily bars: a geometric random walk with a small intraday range
+    rng = np.random.default_rng([seed, index])
+    dates = pd.bdate_range(end=END_DATE, periods=int(years * 252))
+    close = 10 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+    high = close * (1 + rng.uniform(0, 0.02, len(dates)))
+    low = close * (1 - rng.uniform(0, 0.02, len(dates)))
+    return pd.DataFrame({"Date": dates, "Close": close, "High": high, "Low": low,
+                         "Open": (high + low) / 2, "Volume": rng.integers(1_000, 1_000_000, len(dates))})
+
+
+def synthetic_fundamentals(symbols, seed=0):
+    rng = np.random.default_rng([seed, len(symbols)])
+    shares = rng.integers(10_000_000, 1_000_000_000, len(symbols))
+    public = (shares * rng.uniform(0.1, 0.9, len(symbols))).astype(np.int64)
+    price = rng.uniform(1, 500, len(symbols))
+    return [{"Symbol": symbol, "Stock Name": f"Synthetic {symbol}", "Last Price": price[i],
+             "PE": rng.uniform(1, 50), "PB": rng.uniform(0.2, 10), "ROE": rng.uniform(-0.2, 0.5),
+             "EV/EBITDA": rng.uniform(1, 30), "Debt/Equity": rng.uniform(0, 3), "Total Shares": shares[i],
+             "Public Shares": public[i], "Circulation Rate": round(100 * public[i] / shares[i], 2),
+             "Market Cap": price[i] * shares[i]}
+            for i, symbol in enumerate(symbols)]
+
+
+def make_universe(n_symbols, years, seed=0):
+    # Writes the universe through the configured store (MARKET_INFO_STORE) into ./datafolder
+    from cache import frame_cache
+    from fundamentals import fundamentals_store
+
+    symbols = [f"BENCH{i:04d}.IS" for i in range(n_symbols)]
+    for i, symbol in enumerate(symbols):
+        frame_cache.store.write(symbol, synthetic_prices(i, years, seed))
+    fundamentals_store.upsert(synthetic_fundamentals(symbols, seed))
+    frame_cache.invalidate()
+    return symbols
+
+
+def timed(func, repeat):
+    # Seconds for each run; the caller reports the best, which is the least disturbed by other load
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(n_symbols=50, years=5, repeat=3, seed=0, charts=5, workers=None):
+    from cache import frame_cache
+    from Indicator import Indicator
+    from scan import Scan
+    from database import StockData
+    from conditions import compile_conditions
+    import kernels
+    from main import scan_all
+
+    symbols = make_universe(n_symbols, years, seed)
+    plan = compile_conditions(CONDITIONS)
+    results = {}
+
+    def record(name, func, count=len(symbols)):
+        runs = timed(func, repeat)
+        results[name] = {"best": min(runs), "mean": sum(runs) / len(runs), "per_symbol": min(runs) / count, "runs": runs}
+
+    # numba compiles (or loads) each loop on its first call for each kind of array, so every kernel is
+    # called on a small writable and a read-only one (pandas hands out those) before anything is timed
+    start = time.perf_counter()
+    readonly = np.arange(100.0)
+    readonly.flags.writeable = False
+    for x in (np.arange(100.0), readonly):
+        kernels.sma(x, 5), kernels.rolling_std(x, 5), kernels.ema(x, 5), kernels.rma(x, 5), kernels.rsi(x)
+        kernels.adx(x, x, x), kernels.macd(x), kernels.bollinger(x), kernels.relative_volume(x)
+    results["kernels.first_call"] = {"best": time.perf_counter() - start}
+
+    def cold_load():
+        frame_cache.invalidate()
+        for symbol in symbols:
+            frame_cache.load(symbol)
+
+    def warm_load():
+        for symbol in symbols:
+            frame_cache.load(symbol)
+
+    record("load.cold", cold_load)
+    record("load.cached", warm_load)
+    record("load.tail", lambda: [frame_cache.load_tail(symbol, plan.lookback) for symbol in symbols])
+
+    indicators = {
+        "sma_indicator": lambda ind: ind.sma_indicator(50),
+        "ema_indicator": lambda ind: ind.ema_indicator(20),
+        "rsi_indicator": lambda ind: ind.rsi_indicator(14),
+        "adx_indicator": lambda ind: ind.adx_indicator(14),
+        "relative_vol": lambda ind: ind.relative_vol(10),
+        "golden_dead_cross": lambda ind: ind.golden_dead_cross(),
+        "macd_indicator": lambda ind: ind.macd_indicator(),
+        "bollinger_bands": lambda ind: ind.bollinger_bands(),
+        "compute": lambda ind: ind.compute(CHART_INDICATORS),
+    }
+    for name, func in indicators.items():
+        record(f"indicator.{name}", lambda func=func: [func(Indicator(symbol)) for symbol in symbols])
+
+    record("scan.Scan.scan", lambda: [Scan(Indicator(symbol, lookback=plan.lookback), StockData(symbol)).scan(plan)
+                                      for symbol in symbols])
+    record("scan.scan_all", lambda: scan_all(CONDITIONS, symbols, workers=workers))
+    record("scan.scan_all.panel", lambda: scan_all(CONDITIONS, symbols, engine="panel"))
+
+    from backtest import backtest
+    from panel import Panel
+    ta_conditions = [condition for condition in CONDITIONS if condition["type"] == "ta"]
+    record("backtest.load", lambda: Panel(symbols))
+    universe = Panel(symbols)
+    record("backtest.run", lambda: backtest(ta_conditions, panel=universe))
+
+    from chart import StockChart
+    chart_symbols = symbols[:charts]
+    record("chart.stock_chart", lambda: [StockChart(symbol, Indicator(symbol)).stock_chart(0, CHART_INDICATORS, show=False)
+                                         for symbol in chart_symbols], count=max(len(chart_symbols), 1))
+
+    meta = {"symbols": n_symbols, "years": years, "bars": int(years * 252), "repeat": repeat, "seed": seed,
+            "store": frame_cache.store.name, "numba": bool(kernels._load_compiled()), "commit": _commit(),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "matches": len(scan_all(CONDITIONS, symbols))}
+    return {"meta": meta, "results": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time loading, indicators, scans and charts on a synthetic universe")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--charts", type=int, default=5, help="Symbols to build chart figures for")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size for scan_all")
+    parser.add_argument("--output", help="Write the JSON results here instead of printing them")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary data folder and print its path")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="market-info-bench-")
+    output = os.path.abspath(args.output) if args.output else None
+    os.chdir(folder)
+    try:
+        report = run(args.symbols, args.years, args.repeat, args.seed, args.charts, args.workers)
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Benchmark data kept in {folder}", file=sys.stderr)
+        else:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
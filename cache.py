@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+from storage import get_store
+from instrument import timer
+
+
+class FrameCache:
+    # Process-wide cache of typed OHLCV frames keyed by symbol.
+    # An entry is reused only while the stored file's mtime and size are unchanged, and the
+    # least recently used entries are dropped once the memory bound is exceeded.
+    def __init__(self, store=None, max_bytes=256 * 1024 * 1024):
+        self.store = store or get_store()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def set_store(self, store):
+        # Switching backends makes every cached frame meaningless
+        self.store = store
+        self.invalidate()
+
+    def load(self, symbol):
+        return self._load(symbol, None)
+
+    def load_tail(self, symbol, bars):
+        # Only the last `bars` bars; served from a cached full history when there is one
+        return self._load(symbol, bars)
+
+    def _load(self, symbol, bars):
+        signature = self.store.signature(symbol)  # Raises FileNotFoundError like pd.read_csv did
+
+        with self._lock:
+            entry = self._frames.get(symbol)
+            # An entry holds the full history (bars None) or a tail at least as long as entry[3]
+            if entry is not None and entry[0] == signature and (entry[3] is None or (bars is not None and entry[3] >= bars)):
+                self._frames.move_to_end(symbol)
+                self.hits += 1
+                if bars is None:
+                    return entry[1].copy()
+                # Tails are always indexed from 0, wherever they were cut from
+                return entry[1].tail(bars).reset_index(drop=True).copy()
+
+        with timer("load", symbol):
+            df = self.store.read(symbol) if bars is None else self.store.read_tail(symbol, bars)
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            self.misses += 1
+            self._discard(symbol)
+            self._frames[symbol] = (signature, df, size, bars)
+            self._bytes += size
+            # Evict least recently used frames, always keeping the one just loaded
+            while self._bytes > self.max_bytes and len(self._frames) > 1:
+                self._discard(next(iter(self._frames)))
+
+        # Callers add columns to the frame they get, so never hand out the cached one
+        return df.copy()
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._frames.clear()
+                self._bytes = 0
+            else:
+                self._discard(symbol)
+
+    def _discard(self, symbol):
+        entry = self._frames.pop(symbol, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+
+frame_cache = FrameCache()
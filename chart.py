@@ -1,7 +1,53 @@
+import os
+import html
+from multiprocessing import Pool
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
 from plotly.subplots import make_subplots
-import pdb
+from Indicator import Indicator
+from cache import frame_cache
+from conditions import SPEC_NAMES, warmup_bars
+
+# Long charts are aggregated to weekly (or monthly) candles once they would draw more bars than this
+CHART_POINTS = 1500
+# Line overlays with more points than this are drawn with WebGL (Scattergl) instead of SVG
+WEBGL_POINTS = 1000
+PERIODS = {"W": ("W", "Haftalık"), "M": ("M", "Aylık")}
+# Written once per export folder and referenced by every chart page instead of embedded in each
+PLOTLY_JS = "plotly.min.js"
+
+
+def resample_bars(df, rule):
+    # Weekly ("W") or monthly ("M") candles from daily bars, dated by each period's last bar.
+    # Indicator columns keep their value at that last bar, so a daily SMA50 stays a daily SMA50.
+    agg = {col: "last" for col in df.columns}
+    agg.update(Open="first", High="max", Low="min", Close="last", Volume="sum")
+    return df.groupby(df["Date"].dt.to_period(PERIODS[rule][0]), sort=True).agg(agg).reset_index(drop=True)
+
+
+def pick_resample(bars, resample="auto", max_points=CHART_POINTS):
+    # None for daily bars, otherwise "W" or "M"
+    if resample != "auto":
+        return None if resample in (None, "D") else resample
+    if not max_points or bars <= max_points:
+        return None
+    return "W" if bars / 5 <= max_points else "M"
+
+
+def warmup(spec):
+    # Bars the indicators in an Indicator.compute spec need before the first drawn bar, so that a window
+    # gives the same values as the full history (see conditions.warmup_bars)
+    kinds = {name: kind for kind, name in SPEC_NAMES.items()}
+    keys = [("sma", 20)] if spec.get("Bollinger") else []
+    for name, value in spec.items():
+        if name in ("MACD", "CROSS"):
+            keys += [(kinds[name], -1)] if value else []
+        elif name in kinds and value:
+            keys += [(kinds[name], period) for period in (value if isinstance(value, list) else [value])]
+    return max([warmup_bars(key) for key in keys] or [1])
+
 
 class StockChart:
     def __init__(self, symbol, indicator):
@@ -9,35 +55,44 @@ class StockChart:
         self.directory = f"./datafolder/{symbol}.csv"
         self.indicator = indicator
 
-    def load_data(self):
+    def load_data(self, spec=None, bars=None):
         try:
-            df = pd.read_csv(self.directory)
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.date
+            # Prices plus every indicator column in spec, from a single load of the symbol's data.
+            # bars limits the load to the most recent bars, which the store reads without the rest.
+            df = self.indicator.compute(spec or {}, frame_cache.load_tail(self.symbol, bars) if bars else None)
+            df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.normalize()
             df = df.dropna(subset=['Date'])
-            df["Close"] = pd.to_numeric(df["Close"], errors='coerce')
-            df["Open"] = pd.to_numeric(df["Open"], errors='coerce')
-            df["High"] = pd.to_numeric(df["High"], errors='coerce')
-            df["Low"] = pd.to_numeric(df["Low"], errors='coerce')
-            df["Volume"] = pd.to_numeric(df["Volume"], errors='coerce')
             return df
         except Exception as e:
             print(f"Error loading data: {e}")
             return pd.DataFrame()
 
-    def stock_chart(self, period=0, indicators={}):
-        df = self.load_data()
+    def stock_chart(self, period=0, indicators={}, show=True, resample="auto", max_points=CHART_POINTS):
+        # Builds the figure and opens it; show=False only returns it (for saving or benchmarking).
+        # resample: "auto" draws weekly/monthly candles when there are more than max_points bars,
+        # "D" always draws daily bars, "W" or "M" force weekly or monthly candles.
+        spec = dict(indicators)
+        spec["REL_VOL"] = 10  # Relative volume is always drawn under the volume bars
+        # A window of `period` days holds at most `period` bars; only those and their warm-up are read
+        df = self.load_data(spec, period + warmup(spec) if period > 0 else None)
         if df.empty:
             print("Failed to load data.")
             return
 
-        today = pd.to_datetime("today").date()
         if period > 0:
-            start_date = today - pd.Timedelta(days=period)
+            start_date = pd.Timestamp("today").normalize() - pd.Timedelta(days=period)
             df = df[df["Date"] >= start_date]
 
         df = df[df["Volume"] > 0]
 
-        valid_dates = df["Date"].tolist()
+        rule = pick_resample(len(df), resample, max_points)
+        if rule:
+            df = resample_bars(df, rule)
+
+        # One category axis for every subplot: the dates are formatted once and shared by all traces,
+        # and indicator gaps (warm-up bars) are left as NaN rather than dropped
+        x = df["Date"].dt.strftime("%Y-%m-%d").to_numpy()
+        line = go.Scattergl if len(df) > WEBGL_POINTS else go.Scatter
 
         rows = 2
         if "RSI" in indicators: rows += 1
@@ -52,7 +107,7 @@ class StockChart:
         )
         #candlestick chart
         candlestick = go.Candlestick(
-            x=[str(date) for date in valid_dates],
+            x=x,
             open=df["Open"],
             high=df["High"],
             low=df["Low"],
@@ -68,21 +123,14 @@ class StockChart:
                 sma_periods = [sma_periods]
 
             for sma_period in sma_periods:
-                df[f"SMA{sma_period}"] = self.indicator.sma_indicator(sma_period)
-                sma_data = df.dropna(subset=[f"SMA{sma_period}"])
-
-                sma_line = go.Scatter(
-                    x=[str(date) for date in sma_data["Date"]],
-                    y=sma_data[f"SMA{sma_period}"],
+                sma_line = line(
+                    x=x,
+                    y=df[f"SMA{sma_period}"],
                     mode="lines",
                     name=f"SMA {sma_period}",
                     line=dict(color="blue")
                 )
                 fig.add_trace(sma_line, row=1, col=1)
-                fig.update_layout(
-                    xaxis2_rangeslider_visible=False,
-                    xaxis2_type="category"
-                )
 
         # EMA
         if "EMA" in indicators:
@@ -91,12 +139,9 @@ class StockChart:
                 ema_periods = [ema_periods]
 
             for ema_period in ema_periods:
-                df[f"EMA{ema_period}"] = self.indicator.ema_indicator(ema_period)
-                ema_data = df.dropna(subset=[f"EMA{ema_period}"])
-
-                ema_line = go.Scatter(
-                    x=[str(date) for date in ema_data["Date"]],
-                    y=ema_data[f"EMA{ema_period}"],
+                ema_line = line(
+                    x=x,
+                    y=df[f"EMA{ema_period}"],
                     mode="lines",
                     name=f"EMA {ema_period}",
                     line=dict(color="orange")
@@ -105,32 +150,25 @@ class StockChart:
 
         # Bollinger Bands
         if "Bollinger" in indicators and indicators["Bollinger"]:
-            bollinger = self.indicator.bollinger_bands()
-            df["mid_band"] = bollinger["mid_band"]
-            df["upper_band"] = bollinger["upper_band"]
-            df["lower_band"] = bollinger["lower_band"]
-
-            boll_data = df.dropna(subset=["mid_band", "upper_band", "lower_band"])
-
-            mid_band = go.Scatter(
-                x=[str(date) for date in boll_data["Date"]],
-                y=boll_data["mid_band"],
+            mid_band = line(
+                x=x,
+                y=df["BB_MID"],
                 mode="lines",
                 name="Bollinger Mid",
                 line=dict(color="purple", dash="dot")
             )
 
-            upper_band = go.Scatter(
-                x=[str(date) for date in boll_data["Date"]],
-                y=boll_data["upper_band"],
+            upper_band = line(
+                x=x,
+                y=df["BB_UPPER"],
                 mode="lines",
                 name="Bollinger Üst",
                 line=dict(color="red", dash="dash")
             )
 
-            lower_band = go.Scatter(
-                x=[str(date) for date in boll_data["Date"]],
-                y=boll_data["lower_band"],
+            lower_band = line(
+                x=x,
+                y=df["BB_LOWER"],
                 mode="lines",
                 name="Bollinger Alt",
                 line=dict(color="green", dash="dash")
@@ -138,12 +176,10 @@ class StockChart:
 
             fig.add_traces([mid_band, upper_band, lower_band], rows=[1, 1, 1], cols=[1, 1, 1])
 
-        volume_data = df.dropna(subset=["Volume"])
-
-        volume_colors = ["green" if close >= open_ else "red" for close, open_ in zip(df["Close"], df["Open"])]
+        volume_colors = np.where(df["Close"] >= df["Open"], "green", "red")
 
         volume_bars = go.Bar(
-            x=df["Date"].astype(str),
+            x=x,
             y=df["Volume"],
             name="Hacim",
             marker=dict(color=volume_colors),
@@ -151,27 +187,10 @@ class StockChart:
         )
 
         fig.add_trace(volume_bars, row=2, col=1)
-        fig.update_layout(
-            xaxis_rangeslider_visible=False,
-            xaxis_type="category",
-
-            xaxis2=dict(
-                rangeslider_visible=False,
-                type="category"
-            ),
 
-            yaxis2=dict(
-                title="Hacim",
-                side="left",
-                showgrid=False,
-                anchor="x2"
-            )
-        )
-        df["relative_vol"] = self.indicator.relative_vol()
-
-        relative_vol_plot = go.Scatter(
-            x=df["Date"].astype(str),
-            y=df["relative_vol"],
+        relative_vol_plot = line(
+            x=x,
+            y=df["REL_VOL10"],
             mode="lines",
             name="Bağıl Hacim",
             line=dict(color="blue"),
@@ -180,10 +199,13 @@ class StockChart:
 
         fig.add_trace(relative_vol_plot, row=2, col=1)
         fig.update_layout(
-            xaxis2_rangeslider_visible=False,
-            xaxis2_type="category",
+            xaxis2=dict(
+                rangeslider_visible=False,
+                type="category"
+            ),
             yaxis2=dict(
                 overlaying="y2",
+                anchor="x2",
                 side="left",
                 showgrid=False,
                 title="Bağıl Hacim"
@@ -193,12 +215,10 @@ class StockChart:
         row_idx = 3
         if "RSI" in indicators:
             rsi_period = indicators["RSI"]
-            df["RSI"] = self.indicator.rsi_indicator(rsi_period)
-            rsi_data = df.dropna(subset=["RSI"])
 
-            rsi_plot = go.Scatter(
-                x=[str(date) for date in rsi_data["Date"]],
-                y=rsi_data["RSI"],
+            rsi_plot = line(
+                x=x,
+                y=df[f"RSI{rsi_period}"],
                 mode="lines",
                 name=f"RSI {rsi_period}",
                 line=dict(color="purple")
@@ -207,53 +227,92 @@ class StockChart:
             fig.add_trace(rsi_plot, row=row_idx, col=1)
             fig.update_yaxes(range=[0, 100], row=row_idx, col=1)
             row_idx += 1
-            fig.update_layout(
-                xaxis2_rangeslider_visible=False,
-                xaxis2_type="category"
-            )
 
         if "ADX" in indicators:
             adx_period = indicators["ADX"]
-            df["ADX"] = self.indicator.adx_indicator(adx_period)
-            adx_data = df.dropna(subset=["ADX"])
 
-            adx_plot = go.Scatter(
-                x=[str(date) for date in adx_data["Date"]],
-                y=adx_data["ADX"],
+            adx_plot = line(
+                x=x,
+                y=df[f"ADX{adx_period}"],
                 mode="lines",
                 name=f"ADX {adx_period}",
                 line=dict(color="red")
             )
 
             fig.add_trace(adx_plot, row=row_idx, col=1)
-            fig.update_layout(
-                xaxis2_rangeslider_visible=False,
-                xaxis2_type="category"
-            )
             row_idx += 1
 
         if "MACD" in indicators:
-            macd = self.indicator.macd_indicator()
-            df["MACD"] = macd["macd"]
-            macd_data = df.dropna(subset=["MACD"])
-
-            macd_plot = go.Scatter(
-                x=[str(date) for date in macd_data["Date"]],
-                y=macd_data["MACD"],
+            macd_plot = line(
+                x=x,
+                y=df["MACD"],
                 mode="lines",
                 name="MACD"
             )
 
             fig.add_trace(macd_plot, row=row_idx, col=1)
-            fig.update_layout(
-                xaxis2_rangeslider_visible=False,
-                xaxis2_type="category"  #
-            )
 
+        title = f"{period} Günlük {self.symbol} Grafik"
+        if rule:
+            title += f" ({PERIODS[rule][1]})"
         fig.update_layout(
-            title=f"{period} Günlük {self.symbol} Grafik",
+            title=title,
             xaxis_rangeslider_visible=False,
             xaxis_type="category"
         )
 
-        fig.show()
+        if show:
+            fig.show()
+        return fig
+
+
+def _export_chart(job):
+    # Runs in a worker process: writes one symbol's page (and image); returns (symbol, "ok" or the reason it failed)
+    symbol, folder, period, indicators, resample, image_format = job
+    try:
+        fig = StockChart(symbol, Indicator(symbol)).stock_chart(period, indicators, show=False, resample=resample)
+        if fig is None:
+            return symbol, "no price data"
+        fig.write_html(os.path.join(folder, f"{symbol}.html"), include_plotlyjs=PLOTLY_JS)
+        if image_format:
+            fig.write_image(os.path.join(folder, f"{symbol}.{image_format}"))
+        return symbol, "ok"
+    except Exception as e:
+        return symbol, f"{type(e).__name__}: {e}"
+
+
+def export_charts(symbols, indicators={}, folder="charts", period=0, workers=None, image_format=None, resample="auto"):
+    # Writes folder/{symbol}.html for every symbol (e.g. the matches of scan_all), plus an index.html linking them.
+    # Pages load plotly from one shared plotly.min.js; image_format ("png", "svg", ...) also saves static
+    # images, which needs the kaleido package. workers > 1 builds the charts on a process pool.
+    # Returns {symbol: "ok" or the reason it failed}.
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, PLOTLY_JS), "w", encoding="utf-8") as f:
+        f.write(get_plotlyjs())
+
+    if image_format:
+        try:
+            import kaleido  # noqa: F401  Only needed for static images
+        except ImportError:
+            print("Static images need the kaleido package (pip install kaleido); writing HTML only.")
+            image_format = None
+
+    jobs = [(symbol, folder, period, dict(indicators), resample, image_format) for symbol in symbols]
+    if not workers or workers <= 1:
+        report = dict(map(_export_chart, jobs))
+    else:
+        with Pool(processes=workers) as pool:
+            report = dict(pool.imap_unordered(_export_chart, jobs))
+    report = {symbol: report[symbol] for symbol in symbols}
+
+    links = "".join(f'<li><a href="{html.escape(symbol)}.html">{html.escape(symbol)}</a></li>\n'
+                    for symbol, outcome in report.items() if outcome == "ok")
+    with open(os.path.join(folder, "index.html"), "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Charts</title></head>\n"
+                f"<body><ul>\n{links}</ul></body></html>\n")
+
+    failed = {symbol: reason for symbol, reason in report.items() if reason != "ok"}
+    print(f"Exported {len(report) - len(failed)}/{len(report)} charts to {folder}.")
+    for symbol, reason in failed.items():
+        print(f"  {symbol}: {reason}")
+    return report
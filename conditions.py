@@ -0,0 +1,208 @@
+import math
+from instrument import timer
+from quotes import quote_cache
+
+TA_CONDITIONS = {">", "<", "cut_up", "cut_down", "between", "s_value", "g_intersection", "b_intersection"}
+FA_CONDITIONS = {">", "<", "between"}
+CROSSOVERS = {"cut_up", "cut_down"}
+
+# Relative cost of the work behind each condition; cheap ones run first so a failure skips the rest
+COSTS = {"fa": 0, "rel_vol": 1, "sma": 2, "ema": 2, "rsi": 3, "adx": 4, "macd": 4, "g_d_cross": 5, "last_price": 1}
+
+# EMA-style recursions forget their starting point geometrically; this many bars of warm-up leave
+# the starting value with less than this weight, so a tail gives the full-history value to ~1e-6
+CONVERGENCE = 1e-6
+
+
+def _converge(alpha):
+    return int(math.ceil(math.log(CONVERGENCE) / math.log(1 - alpha)))
+
+
+def warmup_bars(key):
+    # Bars an operand needs before its latest value matches a computation over the full history
+    kind = key[0]
+    if kind in ("sma", "rel_vol"):
+        return key[1]
+    elif kind == "ema":
+        return key[1] + _converge(2.0 / (key[1] + 1))
+    elif kind == "rsi":
+        return key[1] + 1 + _converge(1.0 / key[1])
+    elif kind == "adx":
+        # Wilder smoothing of DM/TR, then again for DX
+        return 2 * (key[1] + 1 + _converge(1.0 / key[1]))
+    elif kind == "macd":
+        return 26 + _converge(2.0 / 27) + _converge(2.0 / 10)
+    elif kind == "g_d_cross":
+        return 201
+    return 1
+
+
+def operand_keys(condition):
+    # Translate a TA condition into (case, con_v1, con_v2) keys. An indicator key such as ("ema", 50)
+    # names a computation that can be shared between conditions; ("value", x) is a literal.
+    indicator = condition["indicator"]
+    if indicator in ("sma", "ema"):
+        con_v1 = (indicator, condition["con_v1"])
+        con_v2 = (indicator, condition.get("con_v2", 10))
+        # An empty case compares the last price with the moving averages
+        case = ("last_price",) if condition["case"] == "" else (indicator, condition["case"])
+        return case, con_v1, con_v2
+    elif indicator == "rsi":
+        return ("rsi", 14), ("value", condition["con_v1"]), ("value", condition.get("con_v2", 10))
+    elif indicator == "rel_vol":
+        return ("rel_vol", condition.get("case", 10)), ("value", condition["con_v1"]), ("value", condition.get("con_v2", 1))
+    elif indicator == "adx":
+        return ("adx", condition.get("case", 14)), ("value", condition["con_v1"]), ("value", condition.get("con_v2", 10))
+    elif indicator == "g_d_cross":
+        return ("g_d_cross", -1), ("g_d_cross", -2), ("value", 10)
+    elif indicator == "macd":
+        return ("macd", -1), ("macd", -2), ("value", 10)
+    else:
+        raise ValueError(f"Unsupported indicator type: {indicator}")
+
+
+# Indicator.compute spec name of each operand kind
+SPEC_NAMES = {"sma": "SMA", "ema": "EMA", "rsi": "RSI", "adx": "ADX", "rel_vol": "REL_VOL", "macd": "MACD", "g_d_cross": "CROSS"}
+
+
+def indicator_spec(keys):
+    # Indicator.compute spec covering the given operand keys, e.g. {"EMA": [20, 50], "RSI": [14]}
+    spec = {}
+    for key in keys:
+        name = SPEC_NAMES.get(key[0])
+        if name in ("MACD", "CROSS"):
+            spec[name] = True
+        elif name and key[1] not in spec.setdefault(name, []):
+            spec[name].append(key[1])
+    return spec
+
+
+def min_bars(key):
+    # Bars the per-symbol Indicator methods require before returning a value (None below that)
+    if key[0] == "g_d_cross":
+        return 201
+    elif key[0] == "macd":
+        return 27
+    return key[1]
+
+
+def operand_column(key):
+    # Result column for an operand's latest value, e.g. EMA20, RSI14, CLOSE (an empty case) or GOLDEN_CROSS
+    if key[0] == "last_price":
+        return "CLOSE"
+    if key[0] == "g_d_cross":
+        return "GOLDEN_CROSS"
+    if key[0] == "macd":
+        return "MACD_POSITIVE"
+    return f"{SPEC_NAMES[key[0]]}{key[1]}"
+
+
+def describe(condition):
+    # Short readable label, e.g. "ema5 cut_up ema20", "rsi14 between 40 and 60" or "PE < 10"
+    if condition.get("type") == "fa":
+        case, con_v1, con_v2 = condition["financial ratio"], condition["con_v1"], condition.get("con_v2")
+    else:
+        def name(key):
+            if key[0] == "value":
+                return str(key[1])
+            if key[0] == "last_price":
+                return "price"
+            if key[0] in ("g_d_cross", "macd"):
+                return key[0]
+            return f"{key[0]}{key[1]}"
+        case, con_v1, con_v2 = (name(key) for key in operand_keys(condition))
+
+    kind = condition["condition"]
+    if kind == "between":
+        return f"{case} between {con_v1} and {con_v2}"
+    if kind in ("s_value", "g_intersection", "b_intersection"):
+        return f"{case} {kind}"
+    return f"{case} {kind} {con_v1}"
+
+
+# Indicator.compute column the per-symbol crossover states are read from
+FRAME_COLUMNS = {"g_d_cross": "CROSS", "macd": "HISTOGRAM"}
+
+
+def resolve(key, scan, memo, crossover=False):
+    # Compute an operand for the symbol behind `scan`, reusing anything already in memo. The first
+    # indicator operand loads the symbol's data once; each operand's series are added to that frame
+    # only when it is first needed, so a cheap condition that fails skips the expensive ones.
+    # crossover=True is for cut_up/cut_down, which compare two bars: the last price is then the
+    # loaded Close series (the same local last close) instead of a single quote.
+    if key[0] == "value":
+        return key[1]
+    if key[0] == "last_price" and not crossover:
+        if key not in memo:
+            # A local quote: the stored last close, with no request and no fundamentals rewrite
+            memo[key] = quote_cache.get(scan.stock_data.symbol)
+        return memo[key]
+
+    if "frame" not in memo:
+        memo["frame"] = scan.indicator.load_data()
+    frame = memo["frame"]
+    if key[0] == "last_price":
+        return frame["Close"]
+    if len(frame) < min_bars(key):
+        return None
+
+    column = FRAME_COLUMNS.get(key[0]) or operand_column(key)
+    if column not in frame:
+        memo["frame"] = frame = scan.indicator.compute(indicator_spec([key]), frame)
+
+    if key[0] == "g_d_cross":
+        return frame[column].iloc[key[1]] == "Golden Cross"
+    if key[0] == "macd":
+        return frame[column].iloc[key[1]] > 0  # Positive Signal
+    return frame[column]
+
+
+class ConditionPlan:
+    # A condition list validated once and reused for every symbol: conditions are ordered
+    # cheapest first, shared indicator results are computed once per symbol, and evaluation
+    # stops at the first condition that fails.
+    def __init__(self, conditions):
+        self.conditions = list(conditions)
+        steps = []
+        for position, condition in enumerate(self.conditions):
+            if condition.get("type") == "fa":
+                if condition.get("condition") not in FA_CONDITIONS:
+                    raise ValueError(f"Unsupported condition: {condition.get('condition')}")
+                if "financial ratio" not in condition:
+                    raise ValueError(f"FA condition without a financial ratio: {condition}")
+                keys = None
+                cost = COSTS["fa"]
+            else:
+                if condition.get("condition") not in TA_CONDITIONS:
+                    raise ValueError(f"Unsupported condition: {condition.get('condition')}")
+                keys = operand_keys(condition)
+                cost = max(COSTS.get(key[0], 0) for key in keys)
+            steps.append((cost, position, condition, keys))
+
+        steps.sort(key=lambda step: step[:2])
+        self.steps = [(condition, keys) for _, _, condition, keys in steps]
+        # Distinct computations the plan needs per symbol, e.g. {("ema", 50), ("rsi", 14)}
+        self.requirements = {key for _, keys in self.steps if keys for key in keys if key[0] != "value"}
+        # Bars to load per symbol: the longest warm-up plus one more for crossover checks on the previous bar
+        self.lookback = max([warmup_bars(key) for key in self.requirements] or [1]) + 1
+
+    def evaluate(self, scan):
+        memo = {}
+        for condition, keys in self.steps:
+            if keys is None:
+                with timer("scan.fa", scan.stock_data.symbol):
+                    passed = scan.scan_fa(condition)
+            else:
+                crossover = condition["condition"] in CROSSOVERS
+                operands = [resolve(key, scan, memo, crossover) for key in keys]
+                with timer("scan.compare", scan.stock_data.symbol):
+                    passed = scan.compare(condition, *operands)
+            if not passed:
+                return False
+        return True
+
+
+def compile_conditions(conditions):
+    if isinstance(conditions, ConditionPlan):
+        return conditions
+    return ConditionPlan(conditions)
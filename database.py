@@ -1,138 +1,157 @@
-import yfinance as yf
 import pandas as pd
 from datetime import datetime, timedelta
-import os
-from tabulate import tabulate
 import warnings
+from cache import frame_cache
+from providers import YFinanceProvider
+from fundamentals import fundamentals_store
+from info_cache import info_cache, FIELD_TTLS, PRICE_FIELDS, PRICE_TTL
+from quotes import quote_cache
+from state import StateStore
+from sync import manifest, record_sync, sync_plan
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 class StockData:
-    def __init__(self, symbol):
+    def __init__(self, symbol, provider=None):
         self.symbol = symbol
+        self.provider = provider or YFinanceProvider()
         self.folder = "./datafolder"
         self.file_csv = f"{self.symbol}.csv"
         self.directory = f"{self.folder}/{self.file_csv}"
-
-    def historical_price_data(self, days=1200):
-        today = datetime.now()
-
-        os.makedirs(self.folder, exist_ok=True)
-        if self.file_csv in os.listdir(self.folder):
-            df = pd.read_csv(self.directory)
-            df["Date"] = pd.to_datetime(df["Date"], format="%Y-%m-%d", errors="coerce")
-            past = df["Date"].max()
-            if past > today:
-                print("⚠️ No new data: Deadline is after today.")
-                return
-
-            last_d = yf.download(self.symbol, period="1d")
-            last_d = last_d.reset_index()
-            if last_d.empty:
-                print("Last day data could not be obtained.")
-                return
-
-            last_v_in_csv = int(df["Volume"].iloc[-1])
-            last_v = int(last_d["Volume"].stack().iloc[-1])
-            if last_v == last_v_in_csv:
-                print(f"{self.symbol} data is up to date")
+        self.store = frame_cache.store
+
+    def historical_price_data(self, days=1200, force=False):
+        # Incremental sync: the manifest says which bars are already confirmed, so only the missing tail
+        # and any gaps inside the history are requested, and a current symbol costs no request at all
+        plan = sync_plan(self.symbol, manifest, force=force)
+        if plan["start"] is None and not plan["gaps"]:
+            print(f"{self.symbol} data is up to date")
+            return
+
+        tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+        existed = self.store.exists(self.symbol)
+        if plan["start"] is not None:
+            df = self.provider.download([self.symbol], start=plan["start"], end=tomorrow).get(self.symbol)
+            if df is None and not existed:
+                print(f"No price data could be obtained for {self.symbol}.")
                 return
+            if df is not None:
+                self.append_bars(df)
+                if not existed:
+                    print(f"✅New {self.store.name} data created: {self.store.path(self.symbol)}")
+
+        empty_gaps = []
+        for start, end in plan["gaps"]:
+            df = self.provider.download([self.symbol], start=start, end=end).get(self.symbol)
+            if df is None or df.empty:
+                empty_gaps.append((start, end))  # Nothing traded then; remembered so it isn't asked again
             else:
-                df = df.iloc[:-1]
-
-                new_df = yf.download(self.symbol, start=past, end=today)
-
-                new_df.columns = new_df.columns.droplevel(1) if isinstance(new_df.columns, pd.MultiIndex) else new_df.columns
-
-                new_df = new_df.reset_index()[['Date', 'Close', 'High', 'Low', 'Open', 'Volume']]
-                new_df['Date'] = new_df['Date'].dt.strftime('%Y-%m-%d')
-
-                df_combined = pd.concat([df, new_df], ignore_index=True)
-
-                df_combined.to_csv(self.directory, index=False)
-
-                print(f"New data was added to existing {self.symbol} data and written to CSV successfully.")
-        else:
-            today = datetime.now() + timedelta(days=1)
-            today = today.strftime("%Y-%m-%d")
-
-            data = yf.download(self.symbol, start="2000-01-03", end=today)
-            data = data.reset_index()
-
-            df = pd.DataFrame(data)[['Date', 'Close', 'High', 'Low', 'Open', 'Volume']]
-
-            df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
-
-            df.to_csv(self.directory, index=False)
-
-            print(f"✅New CSV created: {self.directory}")
-
-    def get_stock_data(self, do_print="n"):
-        stock = yf.Ticker(self.symbol)
-        info = stock.info
+                self.merge_bars(df)
+                print(f"Backfilled {len(df)} missing bars of {self.symbol} from {start.date()}.")
+
+        record_sync(self.symbol, manifest, empty_gaps=empty_gaps)
+        manifest.save()
+
+    def append_bars(self, new_df):
+        # Merge freshly downloaded bars: stored bars from the first new date on are replaced, newer ones appended.
+        # Only those bars are written (see the stores' append). Returns False when the download holds
+        # nothing the store doesn't already have.
+        if new_df.empty:
+            return False
+
+        if not self.store.exists(self.symbol):
+            self.store.write(self.symbol, new_df)
+            frame_cache.invalidate(self.symbol)
+            quote_cache.put(self.symbol, new_df["Close"].iloc[-1])
+            return True
+
+        # One bar more than was downloaded: if even that one is on or after the first new date, the
+        # store holds more bars there than the download and can't be up to date
+        df = frame_cache.load_tail(self.symbol, len(new_df) + 1)
+        replaced = df[df["Date"] >= new_df["Date"].min()]
+        if len(replaced) == len(new_df) and (replaced["Volume"].to_numpy() == new_df["Volume"].to_numpy()).all():
+            print(f"{self.symbol} data is up to date")
+            return False
+
+        self.store.append(self.symbol, new_df)
+        frame_cache.invalidate(self.symbol)
+        quote_cache.put(self.symbol, new_df["Close"].iloc[-1])  # The new bars end the history
+
+        print(f"New data was added to existing {self.symbol} data and written to {self.store.name} successfully.")
+        return True
+
+    def merge_bars(self, new_df):
+        # Insert bars anywhere in the history (e.g. a backfilled gap); downloaded bars win on equal dates
+        if not self.store.exists(self.symbol):
+            return self.append_bars(new_df)
+        df = pd.concat([frame_cache.load(self.symbol), new_df], ignore_index=True)
+        df = df.drop_duplicates("Date", keep="last").sort_values("Date", ignore_index=True)
+        self.store.write(self.symbol, df)
+        frame_cache.invalidate(self.symbol)
+        quote_cache.invalidate(self.symbol)
+        StateStore().discard(self.symbol)  # Its running state only continues from the end of the history
+        return True
+
+    def fetch_fundamentals(self, force=False):
+        # One row of fundamentals for this symbol; nothing is written but the info cache. The provider is
+        # only asked when a field the row needs is older than its TTL (see info_cache). A symbol with
+        # price data takes its price from the last stored close once the cached quote is stale, so
+        # ratios and share counts are refetched on their own, slower schedule.
+        quote = quote_cache.get(self.symbol) if not force and self.store.exists(self.symbol) else None
+        fields = [field for field in FIELD_TTLS if quote is None or field not in PRICE_FIELDS]
+        info, age = info_cache.info(self.symbol, self.provider.info, fields, force)
 
         stock_name = info.get("longName", self.symbol)
         last_price = info.get("regularMarketPrice", info.get("currentPrice"))
+        market_cap = info.get("marketCap")
+        if quote is not None and age >= PRICE_TTL:
+            last_price = quote
+            market_cap = quote * info["sharesOutstanding"] if info.get("sharesOutstanding") else market_cap
 
         if info.get("sharesOutstanding") and info.get("floatShares"):
             circulation_rate = (info.get("floatShares") / info.get("sharesOutstanding")) * 100
         else:
-            circulation_rate = "N/A"
+            circulation_rate = None
 
-        new_data = {
+        # Values are stored as numbers: percentages without the "%" sign and missing values as empty cells
+        return {
             "Symbol": self.symbol,
             "Stock Name": stock_name,
-            "Last Price": last_price if last_price is not None else "N/A",
-            "PE": info.get("trailingPE") if info.get("trailingPE") is not None else "N/A",
-            "PB": info.get("priceToBook") if info.get("priceToBook") is not None else "N/A",
-            "ROE": info.get("returnOnEquity") if info.get("returnOnEquity") is not None else "N/A",
-            "EV/EBITDA": info.get("enterpriseToEbitda") if info.get("enterpriseToEbitda") is not None else "N/A",
+            "Last Price": last_price,
+            "PE": info.get("trailingPE"),
+            "PB": info.get("priceToBook"),
+            "ROE": info.get("returnOnEquity"),
+            "EV/EBITDA": info.get("enterpriseToEbitda"),
             "Debt/Equity": (
                 round(info.get("totalDebt", 0) / info.get("totalStockholdersEquity"), 2)
-                if info.get("totalStockholdersEquity") else "N/A"
+                if info.get("totalStockholdersEquity") else None
             ),
-            "Total Shares": info.get("sharesOutstanding", "N/A"),
-            "Public Shares": info.get("floatShares", "N/A"),
-            "Circulation Rate": f"{round(circulation_rate, 2)}%" if circulation_rate != "N/A" else "N/A",
-            "Market Cap": info.get("marketCap", "N/A"),
+            "Total Shares": info.get("sharesOutstanding"),
+            "Public Shares": info.get("floatShares"),
+            "Circulation Rate": round(circulation_rate, 2) if circulation_rate is not None else None,
+            "Market Cap": market_cap,
         }
 
-        file_path = "fundamental_analysis_stocks.csv"
-
-        # If CSV file does not exist, create it with column names
-        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-            columns = ["Symbol", "Stock Name", "Last Price", "PE", "PB", "ROE",
-                       "EV/EBITDA", "Debt/Equity", "Total Shares", "Public Shares",
-                       "Circulation Rate", "Market Cap"]
-            df_old = pd.DataFrame(columns=columns)
-        else:
-            try:
-                df_old = pd.read_csv(file_path)
-            except pd.errors.EmptyDataError:
-                df_old = pd.DataFrame(columns=["Symbol", "Stock Name", "Last Price", "PE", "PB", "ROE",
-                                               "EV/EBITDA", "Debt/Equity", "Total Shares", "Public Shares",
-                                               "Circulation Rate", "Market Cap"])
+    def get_stock_data(self, do_print="n", force=False):
+        # force=True asks the provider even when the cached info is fresh
+        new_data = self.fetch_fundamentals(force)
+        df_old = fundamentals_store.load()
 
-        if self.symbol in df_old["Symbol"].values:
-            last_saved_price = df_old[df_old["Symbol"] == self.symbol]["Last Price"].values[0]
+        if self.symbol in df_old.index:
+            last_saved_price = df_old.at[self.symbol, "Last Price"]
 
-            if last_price == last_saved_price:
+            if new_data["Last Price"] == last_saved_price:
                 print(f"{self.symbol} için fiyat değişmedi, veri güncellenmedi.")
-                return df_old
+                return df_old.reset_index()
 
             print(f"Data updated: {self.symbol}")
 
-        df_old = df_old[df_old["Symbol"] != self.symbol]
+        df_updated = fundamentals_store.upsert([new_data])
 
-        df_new = pd.DataFrame([new_data])
-        df_updated = pd.concat([df_old, df_new], ignore_index=True)
-
-        df_updated.fillna("N/A", inplace=True)
-        df_updated.to_csv(file_path, index=False)
-
-        print(f"Added new stock: {self.symbol} ({stock_name})")
+        print(f"Added new stock: {self.symbol} ({new_data['Stock Name']})")
 
         if do_print == "y":
-            print(tabulate(new_data.items(), headers=["Metric", "Value"], tablefmt="fancy_grid"))
+            from tabulate import tabulate  # Only needed for printing, so it is imported here
+            rows = [(key, "N/A" if value is None else value) for key, value in new_data.items()]
+            print(tabulate(rows, headers=["Metric", "Value"], tablefmt="fancy_grid"))
 
         return df_updated
-
@@ -0,0 +1,198 @@
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from cache import frame_cache
+from database import StockData
+from fundamentals import fundamentals_store
+from providers import YFinanceProvider
+from snapshot import snapshot_row, snapshot_store
+from sync import manifest, record_sync, sync_plan
+from instrument import timer, count
+
+class TokenBucket:
+    # Allows `rate` requests per second on average, with bursts of up to `capacity`
+    def __init__(self, rate=5.0, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedProvider:
+    # Wraps a provider so every request waits for a token and is retried with exponential backoff
+    def __init__(self, provider, bucket, retries=3, backoff=0.5):
+        self.provider = provider
+        self.bucket = bucket
+        self.retries = retries
+        self.backoff = backoff
+
+    @property
+    def batch_size(self):
+        return getattr(self.provider, "batch_size", 1)
+
+    def _call(self, func, *args, **kwargs):
+        for attempt in range(self.retries + 1):
+            with timer("download.throttle"):
+                self.bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                count("download.retries")
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def download(self, symbols, start=None, end=None, period=None):
+        return self._call(self.provider.download, symbols, start=start, end=end, period=period)
+
+    def info(self, symbol):
+        return self._call(self.provider.info, symbol)
+
+
+class BulkDownloader:
+    # Refreshes prices and fundamentals for many symbols on a bounded thread pool.
+    # Only what the sync manifest says is missing is requested: symbols that are current are skipped,
+    # symbols whose missing tail starts on the same date share one multi-ticker request, and gaps
+    # inside a history are backfilled with their own requests.
+    def __init__(self, provider=None, workers=8, rate=5.0, retries=3, backoff=0.5, update_states=True):
+        self.provider = RateLimitedProvider(provider or YFinanceProvider(), TokenBucket(rate), retries, backoff)
+        self.workers = workers
+        self.update_states = update_states
+
+    def _price_batch(self, start, symbols, end):
+        try:
+            frames = self.provider.download(symbols, start=start, end=end)
+        except Exception:
+            if len(symbols) == 1:
+                raise
+            # Retry the batch one symbol at a time so a single bad ticker can't sink the rest
+            results = {}
+            for symbol in symbols:
+                try:
+                    results.update(self._price_batch(start, [symbol], end))
+                except Exception as e:
+                    results[symbol] = f"{type(e).__name__}: {e}"
+            return results
+
+        results = {}
+        for symbol in symbols:
+            if symbol in frames:
+                with timer("store", symbol):
+                    StockData(symbol, self.provider).append_bars(frames[symbol])
+            elif not frame_cache.store.exists(symbol):
+                results[symbol] = "no price data returned"
+                continue
+            # An existing symbol with nothing returned has no new session yet (e.g. a holiday)
+            results[symbol] = "ok"
+        return results
+
+    def _gap(self, symbol, start, end):
+        frames = self.provider.download([symbol], start=start.strftime("%Y-%m-%d"), end=end.strftime("%Y-%m-%d"))
+        if symbol in frames and not frames[symbol].empty:
+            with timer("store", symbol):
+                StockData(symbol, self.provider).merge_bars(frames[symbol])
+        else:
+            self._empty_gaps[symbol].append((start, end))
+        return {symbol: "ok"}
+
+    def _snapshot(self, symbol):
+        with timer("state", symbol):
+            # Advances the incremental state only over the bars written by this refresh
+            self._snapshots[symbol] = snapshot_row(symbol)
+        return {symbol: "ok"}
+
+    def _fundamentals(self, symbol):
+        self._rows[symbol] = StockData(symbol, self.provider).fetch_fundamentals()
+        return "ok"
+
+    def _run(self, jobs):
+        # jobs maps a callable to the symbols it covers; a failed job marks all of them with the error
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(job): symbols for job, symbols in jobs}
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {symbol: f"{type(e).__name__}: {e}" for symbol in futures[future]}
+                results.update(outcome)
+        return results
+
+    def refresh(self, symbols, prices=True, fundamentals=True):
+        # Returns {symbol: "ok" or the reason it failed}
+        report = {symbol: "ok" for symbol in symbols}
+        end = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+
+        if prices:
+            self._snapshots = {}
+            self._empty_gaps = defaultdict(list)
+            plans = {symbol: sync_plan(symbol, manifest) for symbol in symbols}
+            groups = defaultdict(list)
+            for symbol, plan in plans.items():
+                if plan["start"] is not None:
+                    groups[plan["start"].strftime("%Y-%m-%d")].append(symbol)
+
+            size = max(1, self.provider.batch_size)
+            jobs = []
+            for start, group in groups.items():
+                for i in range(0, len(group), size):
+                    batch = group[i:i + size]
+                    jobs.append((lambda s=start, b=batch: self._price_batch(s, b, end), batch))
+            for symbol, outcome in self._run(jobs).items():
+                if outcome != "ok":
+                    report[symbol] = f"prices: {outcome}"
+
+            # Gaps run after the tails, so no two jobs ever write the same symbol at once
+            jobs = [(lambda s=symbol, a=start, b=stop: self._gap(s, a, b), [symbol])
+                    for symbol, plan in plans.items() if report[symbol] == "ok" for start, stop in plan["gaps"]]
+            for symbol, outcome in self._run(jobs).items():
+                if outcome != "ok":
+                    report[symbol] = f"gaps: {outcome}"
+
+            synced = [symbol for symbol, plan in plans.items()
+                      if report[symbol] == "ok" and (plan["start"] is not None or plan["gaps"])]
+            for symbol in synced:
+                record_sync(symbol, manifest, empty_gaps=self._empty_gaps[symbol])
+            manifest.save()
+            skipped = len(plans) - len(synced) - sum(report[symbol] != "ok" for symbol in plans)
+            if skipped:
+                print(f"{skipped} symbols were already up to date.")
+
+            if self.update_states:
+                # Latest indicator values of every refreshed symbol, written as one table for instant screens
+                jobs = [(lambda s=symbol: self._snapshot(s), [symbol]) for symbol in synced]
+                for symbol, outcome in self._run(jobs).items():
+                    if outcome != "ok":
+                        report[symbol] = f"snapshot: {outcome}"
+                snapshot_store.upsert(self._snapshots.values())
+
+        if fundamentals:
+            # Rows are fetched concurrently and committed together in one atomic write
+            self._rows = {}
+            jobs = [(lambda s=symbol: {s: self._fundamentals(s)}, [symbol]) for symbol in symbols]
+            for symbol, outcome in self._run(jobs).items():
+                if outcome != "ok" and report[symbol] == "ok":
+                    report[symbol] = f"fundamentals: {outcome}"
+            if self._rows:
+                fundamentals_store.upsert(self._rows.values())
+
+        failed = {symbol: reason for symbol, reason in report.items() if reason != "ok"}
+        print(f"Refreshed {len(report) - len(failed)}/{len(report)} symbols.")
+        for symbol, reason in failed.items():
+            print(f"  {symbol}: {reason}")
+        return report
@@ -0,0 +1,135 @@
+import os
+import threading
+import pandas as pd
+from locks import FileLock
+from instrument import timer, count
+from storage import DEFAULT_FOLDER, connect_sqlite
+
+FUNDAMENTALS_FILE = "fundamental_analysis_stocks.csv"
+COLUMNS = ["Symbol", "Stock Name", "Last Price", "PE", "PB", "ROE",
+           "EV/EBITDA", "Debt/Equity", "Total Shares", "Public Shares",
+           "Circulation Rate", "Market Cap"]
+NUMERIC_COLUMNS = COLUMNS[2:]
+
+
+def normalize(df):
+    # Typed numeric columns: "51.05%" becomes 51.05 and "N/A" becomes NaN.
+    # Older files were written with those strings, so they are converted on load as well.
+    df = df.reindex(columns=COLUMNS).copy()
+    for col in NUMERIC_COLUMNS:
+        values = df[col]
+        if not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str).str.rstrip("%")
+        df[col] = pd.to_numeric(values, errors="coerce")
+    return df
+
+
+class FundamentalsStore:
+    # The fundamentals table, parsed once and reused until the file changes on disk
+    def __init__(self, path=FUNDAMENTALS_FILE):
+        self.path = path
+        self._signature = None
+        self._table = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Typed table indexed by Symbol; empty when the file is missing or empty
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return normalize(pd.DataFrame(columns=COLUMNS)).set_index("Symbol")
+
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                count("fundamentals.parses")
+                try:
+                    with timer("fundamentals.load"):
+                        df = pd.read_csv(self.path)
+                except pd.errors.EmptyDataError:
+                    df = pd.DataFrame(columns=COLUMNS)
+                self._table = normalize(df).drop_duplicates("Symbol", keep="last").set_index("Symbol")
+                self._signature = signature
+            return self._table
+
+    def upsert(self, rows):
+        # Insert or replace many symbols in one atomic rewrite (temp file + rename) under a file lock,
+        # so concurrent refreshes neither lose each other's rows nor expose a half-written file
+        new = normalize(pd.DataFrame(list(rows), columns=COLUMNS))
+        with FileLock(self.path):
+            old = self.load().reset_index()
+            old = old[~old["Symbol"].isin(new["Symbol"])]
+            updated = pd.concat([old, new.drop_duplicates("Symbol", keep="last")], ignore_index=True)
+
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            updated.to_csv(tmp, index=False)
+            os.replace(tmp, self.path)
+        return updated
+
+    def filter(self, conditions, symbols=None):
+        # Evaluate FA conditions for every symbol at once; returns a boolean Series indexed by symbol
+        table = self.load()
+        if symbols is not None:
+            table = table.reindex(symbols)
+
+        mask = pd.Series(True, index=table.index)
+        for condition in conditions:
+            ratio = condition["financial ratio"]
+            values = table[ratio] if ratio in table.columns else pd.Series(float("nan"), index=table.index)
+            if condition["condition"] == ">":
+                mask &= values > condition["con_v1"]
+            elif condition["condition"] == "<":
+                mask &= values < condition["con_v1"]
+            elif condition["condition"] == "between":
+                mask &= (values > condition["con_v1"]) & (values < condition["con_v2"])
+            else:
+                raise ValueError(f"Unsupported condition: {condition['condition']}")
+        return mask
+
+
+class SqliteFundamentalsStore(FundamentalsStore):
+    # Fundamentals as a table in the SQLite price database, one row per symbol (primary key)
+    def __init__(self, path=os.path.join(DEFAULT_FOLDER, "market.db")):
+        super().__init__(path)
+
+    def _conn(self):
+        conn = connect_sqlite(self.path)
+        columns = ", ".join(f'"{col}" REAL' for col in NUMERIC_COLUMNS)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS fundamentals ("Symbol" TEXT PRIMARY KEY, "Stock Name" TEXT, {columns})')
+        return conn
+
+    def load(self):
+        conn = self._conn()
+        row = conn.execute("SELECT version FROM versions WHERE name = 'fundamentals'").fetchone()
+        with self._lock:
+            if self._table is None or row != self._signature:
+                count("fundamentals.parses")
+                df = pd.DataFrame(conn.execute("SELECT * FROM fundamentals").fetchall(), columns=COLUMNS)
+                self._table = normalize(df).set_index("Symbol")
+                self._signature = row
+            return self._table
+
+    def upsert(self, rows):
+        new = normalize(pd.DataFrame(list(rows), columns=COLUMNS)).drop_duplicates("Symbol", keep="last")
+        values = [tuple(None if pd.isna(v) else v for v in row) for row in new.itertuples(index=False)]
+        placeholders = ", ".join("?" * len(COLUMNS))
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(f"INSERT OR REPLACE INTO fundamentals VALUES ({placeholders})", values)
+            conn.execute("INSERT INTO versions VALUES ('fundamentals', 1) "
+                         "ON CONFLICT(name) DO UPDATE SET version = version + 1")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.load().reset_index()
+
+
+def get_fundamentals_store(kind=None):
+    # Fundamentals follow the price backend: SQLite when MARKET_INFO_STORE=sqlite, the CSV otherwise
+    kind = kind or os.environ.get("MARKET_INFO_STORE", "csv")
+    return SqliteFundamentalsStore() if kind == "sqlite" else FundamentalsStore()
+
+
+fundamentals_store = get_fundamentals_store()
@@ -0,0 +1,81 @@
+import os
+import json
+import time
+import threading
+from instrument import count
+from storage import DEFAULT_FOLDER
+
+INFO_FOLDER = os.path.join(DEFAULT_FOLDER, "info")
+
+# Seconds each kind of provider info field stays fresh: quotes move by the minute, ratios change with
+# each financial report, share counts hardly ever
+PRICE_TTL = 15 * 60
+RATIO_TTL = 24 * 3600
+SHARES_TTL = 7 * 24 * 3600
+PRICE_FIELDS = ["regularMarketPrice", "currentPrice", "marketCap"]
+FIELD_TTLS = {
+    **{field: PRICE_TTL for field in PRICE_FIELDS},
+    **{field: RATIO_TTL for field in ["trailingPE", "priceToBook", "returnOnEquity", "enterpriseToEbitda",
+                                      "totalDebt", "totalStockholdersEquity"]},
+    **{field: SHARES_TTL for field in ["longName", "sharesOutstanding", "floatShares"]},
+}
+
+
+class InfoCache:
+    # Raw provider info payloads, one datafolder/info/{symbol}.json each, with the time they were fetched.
+    # A payload answers a request while every field asked for is younger than its TTL (unknown fields
+    # use PRICE_TTL); otherwise the provider is asked again and the new payload replaces it.
+    def __init__(self, folder=INFO_FOLDER, ttls=None):
+        self.folder = folder
+        self.ttls = dict(FIELD_TTLS, **(ttls or {}))
+        self._entries = {}  # symbol: (file signature, entry)
+        self._lock = threading.Lock()
+
+    def path(self, symbol):
+        return os.path.join(self.folder, f"{symbol}.json")
+
+    def get(self, symbol):
+        # {"fetched_at": epoch seconds, "info": payload} or None when nothing is cached
+        try:
+            stat = os.stat(self.path(symbol))
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._entries.get(symbol)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        try:
+            with open(self.path(symbol), encoding="utf-8") as f:
+                entry = json.load(f)
+        except ValueError:
+            return None  # A damaged file is refetched
+        with self._lock:
+            self._entries[symbol] = (signature, entry)
+        return entry
+
+    def put(self, symbol, info, fetched_at=None):
+        entry = {"fetched_at": time.time() if fetched_at is None else fetched_at, "info": info}
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = f"{self.path(symbol)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp, self.path(symbol))
+        return entry
+
+    def fresh(self, entry, fields, now=None):
+        age = (time.time() if now is None else now) - entry["fetched_at"]
+        return all(age < self.ttls.get(field, PRICE_TTL) for field in fields)
+
+    def info(self, symbol, fetch, fields, force=False):
+        # (payload, age in seconds): the cached payload when all fields are fresh, else fetch(symbol)
+        entry = None if force else self.get(symbol)
+        if entry is not None and self.fresh(entry, fields):
+            count("info_cache.hits")
+            return entry["info"], time.time() - entry["fetched_at"]
+        count("info_cache.misses")
+        entry = self.put(symbol, fetch(symbol))
+        return entry["info"], 0.0
+
+
+info_cache = InfoCache()
@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+import contextlib
+from collections import defaultdict
+
+# Opt-in stage timers and counters. Disabled (the default) a timer is one function call returning a
+# shared no-op context, so the hooks can stay in the hot paths. Enable with enable() or
+# MARKET_INFO_PROFILE=1. Only the current process is measured: scan_all with workers > 1 does its
+# per-symbol work in pool processes, so profile scans with workers=None.
+
+enabled = os.environ.get("MARKET_INFO_PROFILE", "0") == "1"
+
+_NULL = contextlib.nullcontext()
+_lock = threading.Lock()
+_stages = defaultdict(lambda: [0, 0.0, 0.0])  # stage: [calls, total seconds, slowest call]
+_symbols = defaultdict(lambda: defaultdict(float))  # symbol: {stage: seconds}
+_totals = defaultdict(float)  # symbol: seconds in its outermost timed blocks, so nested stages count once
+_counters = defaultdict(int)
+_local = threading.local()
+
+
+class _Timer:
+    __slots__ = ("stage", "symbol", "start")
+
+    def __init__(self, stage, symbol):
+        self.stage = stage
+        self.symbol = symbol
+
+    def __enter__(self):
+        if self.symbol is not None:
+            _local.depth = getattr(_local, "depth", 0) + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            stats = _stages[self.stage]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            if self.symbol is not None:
+                _symbols[self.symbol][self.stage] += elapsed
+                _local.depth -= 1
+                if _local.depth == 0:
+                    _totals[self.symbol] += elapsed
+
+
+def timer(stage, symbol=None):
+    # with timer("load", symbol): ... adds the block's wall time to the stage (and to the symbol)
+    return _Timer(stage, symbol) if enabled else _NULL
+
+
+def count(name, n=1):
+    if enabled:
+        with _lock:
+            _counters[name] += n
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _symbols.clear()
+        _totals.clear()
+        _counters.clear()
+
+
+def summary(top=10):
+    # Everything recorded so far: per-stage totals, the top slowest symbols and cache hit rates
+    from cache import frame_cache
+
+    with _lock:
+        stages = {stage: {"calls": calls, "seconds": total, "mean": total / calls, "max": slowest}
+                  for stage, (calls, total, slowest) in _stages.items()}
+        symbols = sorted(((_totals[symbol], symbol, dict(times)) for symbol, times in _symbols.items()), reverse=True)
+        counters = dict(_counters)
+
+    lookups = frame_cache.hits + frame_cache.misses
+    counters["frame_cache.hits"] = frame_cache.hits
+    counters["frame_cache.misses"] = frame_cache.misses
+    counters["frame_cache.hit_rate"] = frame_cache.hits / lookups if lookups else None
+    return {"stages": stages,
+            "slowest_symbols": [{"symbol": symbol, "seconds": total, "stages": times} for total, symbol, times in symbols[:top]],
+            "counters": counters}
+
+
+def report(top=10):
+    # summary() as printable text
+    data = summary(top)
+    lines = [f"{'Stage':<24}{'Calls':>8}{'Total s':>11}{'Mean ms':>10}{'Max ms':>10}"]
+    for stage, stats in sorted(data["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"{stage:<24}{stats['calls']:>8}{stats['seconds']:>11.3f}{1000 * stats['mean']:>10.2f}{1000 * stats['max']:>10.2f}")
+    if data["slowest_symbols"]:
+        lines.append("")
+        lines.append(f"Slowest {len(data['slowest_symbols'])} symbols:")
+        for entry in data["slowest_symbols"]:
+            detail = ", ".join(f"{stage} {1000 * seconds:.1f}ms" for stage, seconds in sorted(entry["stages"].items()))
+            lines.append(f"  {entry['symbol']:<14}{entry['seconds']:>9.3f}s  ({detail})")
+    lines.append("")
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"{name}: {'n/a' if value is None else (f'{value:.1%}' if name.endswith('rate') else value)}")
+    return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profile(path=None):
+    # Runs the block under cProfile; dumps the stats to path (for pstats / snakeviz) when one is given
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
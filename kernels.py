@@ -0,0 +1,402 @@
+import os
+import numpy as np
+
+# Indicator kernels on raw float arrays. Every function takes a 1-D array (one symbol) or a
+# 2-D bars x symbols array and works down axis 0, matching pandas rolling/ewm and pandas_ta:
+# leading NaNs are skipped, a window containing NaN yields NaN.
+#
+# With numba each kernel is a compiled single pass per column with no temporaries. Without it,
+# the NumPy fallbacks loop over bars only and do every column at once. numba is optional and is
+# only imported when the first kernel runs, so importing this module stays cheap.
+
+
+def _as_2d(x):
+    x = np.asarray(x, dtype=np.float64)
+    return (x.reshape(-1, 1), True) if x.ndim == 1 else (x, False)
+
+
+def _shape(out, flat):
+    return out[:, 0] if flat else out
+
+
+def _shift(x):
+    out = np.empty_like(x)
+    out[:1] = np.nan
+    out[1:] = x[:-1]
+    return out
+
+
+# Compiled loops
+
+def _sma_loop(x, period):
+    n, m = x.shape
+    out = np.full((n, m), np.nan)
+    for j in range(m):
+        total = 0.0
+        count = 0
+        for t in range(n):
+            v = x[t, j]
+            if not np.isnan(v):
+                total += v
+                count += 1
+            if t >= period:
+                old = x[t - period, j]
+                if not np.isnan(old):
+                    total -= old
+                    count -= 1
+            if count == period:
+                out[t, j] = total / period
+    return out
+
+
+def _std_loop(x, period):
+    n, m = x.shape
+    out = np.full((n, m), np.nan)
+    for j in range(m):
+        for t in range(period - 1, n):
+            total = 0.0
+            for i in range(t - period + 1, t + 1):
+                total += x[i, j]
+            mean = total / period
+            squares = 0.0
+            for i in range(t - period + 1, t + 1):
+                squares += (x[i, j] - mean) ** 2
+            out[t, j] = np.sqrt(squares / (period - 1))
+    return out
+
+
+def _ema_loop(x, alpha):
+    # As pandas ewm(adjust=False): the previous value keeps decaying across a gap of NaNs
+    n, m = x.shape
+    out = np.empty((n, m))
+    for j in range(m):
+        prev = np.nan
+        weight = 1.0
+        for t in range(n):
+            v = x[t, j]
+            if np.isnan(prev):
+                prev = v
+            else:
+                weight *= 1.0 - alpha
+                if not np.isnan(v):
+                    prev = (weight * prev + alpha * v) / (weight + alpha)
+                    weight = 1.0
+            out[t, j] = prev
+    return out
+
+
+def _rma_step(state, v, decay, period):
+    # state = [numerator, denominator, count] of ewm(alpha=1/period, adjust=True, min_periods=period)
+    if np.isnan(v):
+        if state[2] > 0:
+            state[0] *= decay
+            state[1] *= decay
+    else:
+        state[0] = state[0] * decay + v
+        state[1] = state[1] * decay + 1.0
+        state[2] += 1.0
+    if state[2] >= period and state[1] != 0:
+        return state[0] / state[1]
+    return np.nan
+
+
+def _rma_loop(x, period):
+    n, m = x.shape
+    out = np.empty((n, m))
+    decay = 1.0 - 1.0 / period
+    state = np.zeros(3)
+    for j in range(m):
+        state[:] = 0.0
+        for t in range(n):
+            out[t, j] = _rma_step(state, x[t, j], decay, period)
+    return out
+
+
+def _rsi_loop(close, period):
+    n, m = close.shape
+    out = np.empty((n, m))
+    decay = 1.0 - 1.0 / period
+    pos = np.zeros(3)
+    neg = np.zeros(3)
+    for j in range(m):
+        pos[:] = 0.0
+        neg[:] = 0.0
+        prev = np.nan
+        for t in range(n):
+            diff = close[t, j] - prev
+            prev = close[t, j]
+            if np.isnan(diff):
+                p = _rma_step(pos, np.nan, decay, period)
+                q = _rma_step(neg, np.nan, decay, period)
+            else:
+                p = _rma_step(pos, max(diff, 0.0), decay, period)
+                q = _rma_step(neg, max(-diff, 0.0), decay, period)
+            out[t, j] = 100.0 * p / (p + q)
+    return out
+
+
+def _adx_loop(high, low, close, period):
+    n, m = close.shape
+    adx = np.empty((n, m))
+    dmp = np.empty((n, m))
+    dmn = np.empty((n, m))
+    decay = 1.0 - 1.0 / period
+    tr_s = np.zeros(3)
+    pos_s = np.zeros(3)
+    neg_s = np.zeros(3)
+    dx_s = np.zeros(3)
+    for j in range(m):
+        tr_s[:] = 0.0
+        pos_s[:] = 0.0
+        neg_s[:] = 0.0
+        dx_s[:] = 0.0
+        for t in range(n):
+            if t == 0:
+                true_range = up = down = np.nan
+            else:
+                pc = close[t - 1, j]
+                true_range = max(high[t, j] - low[t, j], max(abs(high[t, j] - pc), abs(low[t, j] - pc)))
+                if np.isnan(pc) or np.isnan(high[t, j] - low[t, j]):
+                    true_range = np.nan
+                up = high[t, j] - high[t - 1, j]
+                down = low[t - 1, j] - low[t, j]
+            if np.isnan(up) or np.isnan(down):
+                pos_dm = neg_dm = np.nan
+            else:
+                pos_dm = up if up > down and up > 0 else 0.0
+                neg_dm = down if down > up and down > 0 else 0.0
+            k = 100.0 / _rma_step(tr_s, true_range, decay, period)
+            p = k * _rma_step(pos_s, pos_dm, decay, period)
+            q = k * _rma_step(neg_s, neg_dm, decay, period)
+            dmp[t, j] = p
+            dmn[t, j] = q
+            adx[t, j] = _rma_step(dx_s, 100.0 * abs(p - q) / (p + q), decay, period)
+    return adx, dmp, dmn
+
+
+_compiled = None  # {name: compiled loop}, filled on first use; empty without numba
+
+
+def _load_compiled():
+    global _compiled
+    if _compiled is None:
+        from instrument import timer
+        with timer("kernels.load"):
+            _compiled = _compile()
+    return _compiled
+
+
+def _compile():
+    global _rma_step
+    try:
+        # MARKET_INFO_NUMBA=0 skips numba, e.g. for short runs where loading it costs more than it saves
+        if os.environ.get("MARKET_INFO_NUMBA", "1") == "0":
+            raise ImportError
+        from numba import njit
+    except ImportError:  # The NumPy versions below are used without numba
+        return {}
+    jit = njit(cache=True, error_model="numpy")
+    _rma_step = jit(_rma_step)  # Rebound before the loops below compile, so they inline the jitted step
+    return {name: jit(func) for name, func in [
+        ("sma", _sma_loop), ("std", _std_loop), ("ema", _ema_loop), ("rma", _rma_loop),
+        ("rsi", _rsi_loop), ("adx", _adx_loop)]}
+
+
+# NumPy fallbacks
+
+def _sma_numpy(x, period):
+    valid = ~np.isnan(x)
+    sums = np.cumsum(np.where(valid, x, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums[period:] = sums[period:] - sums[:-period]
+    counts[period:] = counts[period:] - counts[:-period]
+    out = sums / period
+    out[counts < period] = np.nan
+    return out
+
+
+def _std_numpy(x, period):
+    out = np.full_like(x, np.nan)
+    if len(x) >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(x, period, axis=0)
+        out[period - 1:] = windows.std(axis=-1, ddof=1)
+    return out
+
+
+def _ema_numpy(x, alpha):
+    out = np.empty_like(x)
+    prev = np.full(x.shape[1:], np.nan)
+    weight = np.ones(x.shape[1:])
+    for t in range(len(x)):
+        row = x[t]
+        gap = np.isnan(row) & ~np.isnan(prev)
+        weight = weight * (1.0 - alpha)
+        step = (weight * prev + alpha * row) / (weight + alpha)
+        prev = np.where(np.isnan(prev), row, np.where(np.isnan(row), prev, step))
+        weight = np.where(gap, weight, 1.0)
+        out[t] = prev
+    return out
+
+
+def _rma_numpy(x, period):
+    decay = 1.0 - 1.0 / period
+    out = np.empty_like(x)
+    num = np.zeros(x.shape[1:])
+    den = np.zeros(x.shape[1:])
+    count = np.zeros(x.shape[1:])
+    for t in range(len(x)):
+        row = x[t]
+        valid = ~np.isnan(row)
+        started = (count > 0) | valid
+        num = np.where(started, num * decay + np.where(valid, row, 0.0), 0.0)
+        den = np.where(started, den * decay + valid, 0.0)
+        count = count + valid
+        out[t] = np.where((count >= period) & (den != 0), num / np.where(den == 0, 1.0, den), np.nan)
+    return out
+
+
+def _rsi_numpy(close, period):
+    diff = close - _shift(close)
+    positive = _rma_numpy(np.where(diff < 0, 0.0, diff), period)
+    negative = _rma_numpy(np.where(diff > 0, 0.0, -diff), period)
+    return 100 * positive / (positive + negative)
+
+
+def _adx_numpy(high, low, close, period):
+    prev_close = _shift(close)
+    true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    up = high - _shift(high)
+    down = _shift(low) - low
+    missing = np.isnan(up) | np.isnan(down)
+    pos = np.where(missing, np.nan, np.where((up > down) & (up > 0), up, 0.0))
+    neg = np.where(missing, np.nan, np.where((down > up) & (down > 0), down, 0.0))
+    k = 100 / _rma_numpy(true_range, period)
+    dmp = k * _rma_numpy(pos, period)
+    dmn = k * _rma_numpy(neg, period)
+    dx = 100 * np.abs(dmp - dmn) / (dmp + dmn)
+    return _rma_numpy(dx, period), dmp, dmn
+
+
+def _run(name, fallback, *arrays_and_args):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        func = _load_compiled().get(name, fallback)
+        return func(*arrays_and_args)
+
+
+# Public kernels
+
+def sma(x, period):
+    x, flat = _as_2d(x)
+    return _shape(_run("sma", _sma_numpy, x, period), flat)
+
+
+def rolling_std(x, period):
+    # Sample standard deviation (ddof=1), as pandas rolling().std()
+    x, flat = _as_2d(x)
+    return _shape(_run("std", _std_numpy, x, period), flat)
+
+
+def ema(x, period):
+    # ewm(span=period, adjust=False).mean()
+    x, flat = _as_2d(x)
+    return _shape(_run("ema", _ema_numpy, x, 2.0 / (period + 1)), flat)
+
+
+def rma(x, period):
+    # Wilder smoothing as pandas_ta: ewm(alpha=1/period, adjust=True, min_periods=period).mean()
+    x, flat = _as_2d(x)
+    return _shape(_run("rma", _rma_numpy, x, period), flat)
+
+
+def rsi(close, period=14):
+    close, flat = _as_2d(close)
+    return _shape(_run("rsi", _rsi_numpy, close, period), flat)
+
+
+def adx(high, low, close, period=14):
+    # Returns (ADX, +DI, -DI), as the ADX_n, DMP_n and DMN_n columns of pandas_ta.adx
+    high, flat = _as_2d(high)
+    low, _ = _as_2d(low)
+    close, _ = _as_2d(close)
+    return tuple(_shape(out, flat) for out in _run("adx", _adx_numpy, high, low, close, period))
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    # Returns (MACD line, signal line, histogram)
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, period=20, width=2.0):
+    # Returns (middle, upper, lower) bands
+    mid = sma(close, period)
+    std = rolling_std(close, period)
+    return mid, mid + width * std, mid - width * std
+
+
+def relative_volume(volume, period=10):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.asarray(volume, dtype=np.float64) / sma(volume, period)
+
+
+def validate(bars=3000, seed=0, tolerance=1e-9):
+    # Compare every kernel with the pandas implementation it replaces on a synthetic series
+    # (with gaps and a NaN-padded start); returns {name: max relative error} and raises past tolerance
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    high = close * (1 + rng.uniform(0, 0.02, bars))
+    low = close * (1 - rng.uniform(0, 0.02, bars))
+    volume = rng.integers(0, 1_000_000, bars).astype(np.float64)
+    for series in (close, high, low):
+        series[:25] = np.nan
+        series[bars // 2] = np.nan
+    c, h, lo, v = (pd.Series(a) for a in (close, high, low, volume))
+
+    def wilder(s, period):
+        return s.ewm(alpha=1.0 / period, min_periods=period).mean()
+
+    diff = c.diff()
+    ref_rsi = 100 * wilder(diff.clip(lower=0), 14) / (wilder(diff.clip(lower=0), 14) + wilder((-diff).clip(lower=0), 14))
+    prev = c.shift()
+    tr = pd.concat([h - lo, (h - prev).abs(), (lo - prev).abs()], axis=1).max(axis=1, skipna=False)
+    up, down = h - h.shift(), lo.shift() - lo
+    pos = (((up > down) & (up > 0)) * up).where(up.notna() & down.notna())
+    neg = (((down > up) & (down > 0)) * down).where(up.notna() & down.notna())
+    k = 100 / wilder(tr, 14)
+    dmp, dmn = k * wilder(pos, 14), k * wilder(neg, 14)
+    ref_adx = wilder(100 * (dmp - dmn).abs() / (dmp + dmn), 14)
+    ref_macd = c.ewm(span=12, adjust=False).mean() - c.ewm(span=26, adjust=False).mean()
+
+    checks = {
+        "sma": (sma(close, 50), c.rolling(50).mean()),
+        "std": (rolling_std(close, 20), c.rolling(20).std()),
+        "ema": (ema(close, 20), c.ewm(span=20, adjust=False).mean()),
+        "rsi": (rsi(close, 14), ref_rsi),
+        "adx": (adx(high, low, close, 14)[0], ref_adx),
+        "macd": (macd(close)[1], ref_macd.ewm(span=9, adjust=False).mean()),
+        "rel_vol": (relative_volume(volume, 10), v / v.rolling(10).mean()),
+    }
+    try:
+        import pandas_ta as ta
+        checks["pandas_ta.rsi"] = (rsi(close, 14), ta.rsi(c, 14))
+        checks["pandas_ta.adx"] = (adx(high, low, close, 14)[0], ta.adx(h, lo, c, 14)["ADX_14"])
+    except ImportError:  # pandas_ta is no longer a dependency; compare with it only when it is around
+        pass
+
+    errors = {}
+    for name, (got, expected) in checks.items():
+        expected = expected.to_numpy()
+        if not np.array_equal(np.isnan(got), np.isnan(expected)):
+            raise AssertionError(f"{name}: NaN positions differ from pandas")
+        scale = np.maximum(np.abs(expected), 1.0)
+        errors[name] = float(np.nanmax(np.abs(got - expected) / scale))
+        if errors[name] > tolerance:
+            raise AssertionError(f"{name}: relative error {errors[name]:.3g} exceeds {tolerance}")
+    return errors
+
+
+if __name__ == "__main__":
+    print("numba" if _load_compiled() else "numpy", validate())
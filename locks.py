@@ -0,0 +1,58 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class _Holder:
+    # Per-path state shared by every FileLock on that path within this process
+    def __init__(self):
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.file = None
+
+
+class FileLock:
+    # Exclusive lock shared between processes (through a .lock file) and threads of this process.
+    # Re-entrant within a thread, so nested writers on the same file don't deadlock.
+    # shared=True takes a reader lock instead: readers in different processes don't block each other,
+    # only writers (on Windows it is exclusive too). Inside a writer's block it is a no-op re-entry.
+    _holders = {}
+    _guard = threading.Lock()
+
+    def __init__(self, path, shared=False):
+        self.path = os.path.abspath(path) + ".lock"
+        self.shared = shared
+        with FileLock._guard:
+            self._holder = FileLock._holders.setdefault(self.path, _Holder())
+
+    def __enter__(self):
+        holder = self._holder
+        holder.thread_lock.acquire()
+        holder.depth += 1
+        if holder.depth == 1:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            holder.file = open(self.path, "a+")
+            if fcntl:
+                fcntl.flock(holder.file.fileno(), fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+            else:
+                holder.file.seek(0)
+                msvcrt.locking(holder.file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, *exc):
+        holder = self._holder
+        holder.depth -= 1
+        if holder.depth == 0:
+            if fcntl:
+                fcntl.flock(holder.file.fileno(), fcntl.LOCK_UN)
+            else:
+                holder.file.seek(0)
+                msvcrt.locking(holder.file.fileno(), msvcrt.LK_UNLCK, 1)
+            holder.file.close()
+            holder.file = None
+        holder.thread_lock.release()
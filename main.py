@@ -1,66 +1,269 @@
-import time
+import argparse
+import contextlib
+import json
+import sys
+import instrument
+import pandas as pd
+from functools import partial
+from multiprocessing import Pool
 from database import StockData
 from Indicator import Indicator
 from scan import Scan
+from conditions import compile_conditions
+from fundamentals import fundamentals_store
 from STOCK_N import stock as stock_list
-from chart import StockChart
-
-def download_all_stock_d(stock_n_l):
-    for stock in stock_n_l:
-        stock_object_data = StockData(stock)  #
-        stock_object_data.historical_price_data()
-        stock_object_data.get_stock_data()
-        time.sleep(0.2)
-
-def scan_all(condition_list, symbol_list):
-    match_l = []
-    scan_objts = []
-
-    for symbol in symbol_list:
-        indicator_obj = Indicator(symbol)
-        data_obj = StockData(symbol)
-        scan_obj = Scan(indicator_obj, data_obj)
-        scan_objts.append(scan_obj)
-
-    for scan_obj in scan_objts:
-        result = scan_obj.scan(condition_list)
-        if result:
-            match_l.append(scan_obj.indicator.stock_c)
-
-    return match_l
-
-#download_all_stock_d(stock_list)
-d = StockData("A1CAP.IS")
-d.historical_price_data()
-d.get_stock_data()
-indicator = Indicator("A1CAP.IS")
-chart = StockChart("A1CAP.IS", indicator)
-
-
-# Create chart object and display chart
-
-chart.stock_chart(period=150, indicators ={
-    "RSI": 14,                                 #grafikte istenen indikatörleri koymak için örnek
-    "EMA": [10,25],
-    "MACD": True
-})
-
-#Some condition examples for scan technical analysis
-
-#condition1 = {"type": "ta" ,"indicator": "ema" ,"case": 50, "condition": "cut_down", "con_v1": 200}
-#condition2 = {"type": "ta" ,"indicator": "rsi" ,"condition": "cut_down","con_v1": 50}
-#condition3 = {"type": "ta" ,"indicator": "rel_vol", "condition": ">", "con_v1": 2}
-#condition4 = {"type": "ta" ,"indicator": "sma" ,"case": "","condition": "between", "con_v1": 10, "conv2":25}
-#condition5 = {"type": "ta" ,"indicator": "adx" ,"condition": "between","con_v1": 15, "con_v2": 25}
-#condition6 = {"type": "ta" ,"indicator": "macd" ,"condition":"g_intersection"}
-#scan temel analiz için bazı koşul örnekleri
-#conditionfa1 = {"type": "fa" ,"financial ratio": "PE" ,"condition": "<", "con_v1": 10}
-conditions_l = []
-stock_l = stock_list
-#tarama çağırma örneği
-a = scan_all(condition_list=conditions_l, symbol_list=stock_l)
-
-#my indicator
-#condition_ = {"type": "ta" ,"indicator": "ema" ,"case": 5, "condition": "cut_up", "con_v1": 20} #controls the short-term trend
-#condition__ = {"type": "ta" ,"indicator": "rsi" ,"condition": "cut_up","con_v1": 50} #controls momentum
-#condition___ = {"type": "ta" ,"indicator": "rel_vol", "condition": ">", "con_v1": 2} #checks the market is here
+
+# Importing this module has no side effects and leaves plotly, the downloader and the panel engine
+# unloaded; the functions and CLI commands below import them only when they need them.
+
+def download_all_stock_d(stock_n_l, workers=8, rate=5.0, provider=None):
+    # Concurrent, rate-limited refresh of prices and fundamentals; returns {symbol: "ok" or failure reason}
+    from downloader import BulkDownloader
+    return BulkDownloader(provider, workers=workers, rate=rate).refresh(stock_n_l)
+
+def _scan_symbol(plan, symbol):
+    # Runs in a worker process: returns the symbol if it matches, otherwise None.
+    # Only the tail of the history that the plan's indicators need is loaded.
+    scan_obj = Scan(Indicator(symbol, lookback=plan.lookback), StockData(symbol))
+    return symbol if scan_obj.scan(plan) else None
+
+def iter_scan(condition_list, symbol_list, workers=None, chunksize=8, ordered=True):
+    # Yields matching symbols as soon as they are found.
+    # workers > 1 spreads symbols over a process pool; ordered=False yields in completion order.
+    plan = compile_conditions(condition_list)
+    if not workers or workers <= 1:
+        for symbol in symbol_list:
+            if _scan_symbol(plan, symbol):
+                yield symbol
+        return
+
+    job = partial(_scan_symbol, plan)
+    with Pool(processes=workers) as pool:
+        results = pool.imap(job, symbol_list, chunksize) if ordered else pool.imap_unordered(job, symbol_list, chunksize)
+        for symbol in results:
+            if symbol:
+                yield symbol
+
+def scan_all(condition_list, symbol_list, engine="symbol", workers=None, chunksize=8):
+    # engine="panel" evaluates technical conditions for the whole universe in single NumPy passes;
+    # engine="snapshot" answers them from the precomputed table of latest indicator values
+    if engine == "snapshot":
+        from snapshot import snapshot_store
+        if snapshot_store.covers(condition_list):
+            return snapshot_store.scan(condition_list, symbol_list)
+        print("The snapshot table does not cover these conditions, scanning with the panel engine instead.")
+        engine = "panel"
+
+    if engine == "panel":
+        from panel import Panel
+        plan = compile_conditions(condition_list)
+        return Panel(symbol_list, lookback=plan.lookback).scan(plan)
+
+    # Validate and order the conditions once instead of for every symbol
+    plan = compile_conditions(condition_list)
+
+    # FA conditions are answered for the whole universe in one mask, leaving only TA work per symbol
+    fa_conditions = [condition for condition, keys in plan.steps if keys is None]
+    if fa_conditions:
+        passed = fundamentals_store.filter(fa_conditions, symbol_list)
+        symbol_list = [symbol for symbol, ok in zip(symbol_list, passed.to_numpy()) if ok]
+        plan = compile_conditions([condition for condition, keys in plan.steps if keys is not None])
+
+    return list(iter_scan(plan, symbol_list, workers=workers, chunksize=chunksize))
+
+def scan_table(condition_list, symbol_list, engine="panel"):
+    # One row per symbol with every condition's operand values and pass/fail, plus "passed" overall,
+    # built in bulk by the panel engine or from the snapshot table (engine="snapshot")
+    if engine == "snapshot":
+        from snapshot import snapshot_store
+        if snapshot_store.covers(condition_list):
+            return snapshot_store.scan_table(condition_list, symbol_list)
+        print("The snapshot table does not cover these conditions, scanning with the panel engine instead.")
+
+    from panel import Panel
+    plan = compile_conditions(condition_list)
+    return Panel(symbol_list, lookback=plan.lookback).scan_table(plan)
+
+def _symbols(args):
+    return args.symbols or stock_list
+
+
+def _load_conditions(args):
+    # Conditions come as JSON: -c once per condition dict, and/or -f with a file holding a list of them, e.g.
+    # -c '{"type": "ta", "indicator": "rsi", "condition": "cut_up", "con_v1": 50}'
+    conditions = [json.loads(text) for text in args.condition or []]
+    if args.file:
+        with open(args.file) as f:
+            conditions += json.load(f)
+    return conditions
+
+
+def cmd_download(args):
+    from downloader import BulkDownloader
+    downloader = BulkDownloader(workers=args.workers, rate=args.rate)
+    report = downloader.refresh(_symbols(args), prices=not args.no_prices, fundamentals=not args.no_fundamentals)
+    return 0 if all(status == "ok" for status in report.values()) else 1
+
+
+def cmd_scan(args):
+    if args.table or args.output:
+        # The symbol engine works one symbol at a time, so result tables come from the panel engine
+        engine = "snapshot" if args.engine == "snapshot" else "panel"
+        table = scan_table(_load_conditions(args), _symbols(args), engine=engine)
+        if not args.all:
+            table = table[table["passed"]]
+        if args.output:
+            table.to_csv(args.output)
+        else:
+            print(table.to_string())
+        return 0
+
+    matches = scan_all(_load_conditions(args), _symbols(args), engine=args.engine, workers=args.workers)
+    for symbol in matches:
+        print(symbol)
+    return 0
+
+
+def _indicators(args):
+    indicators = {"SMA": args.sma, "EMA": args.ema, "RSI": args.rsi, "ADX": args.adx,
+                  "MACD": args.macd, "Bollinger": args.bollinger}
+    return {name: value for name, value in indicators.items() if value}
+
+
+def cmd_chart(args):
+    from chart import StockChart
+    indicators = _indicators(args)
+    StockChart(args.symbol, Indicator(args.symbol)).stock_chart(period=args.period, indicators=indicators,
+                                                                resample=args.resample)
+    return 0
+
+
+def cmd_charts(args):
+    from chart import export_charts
+    symbols = _symbols(args)
+    if args.condition or args.file:
+        # Chart only the symbols that match the conditions
+        symbols = scan_all(_load_conditions(args), symbols, engine=args.engine)
+        if not symbols:
+            print("No matches, no charts exported.")
+            return 0
+    report = export_charts(symbols, _indicators(args), folder=args.folder, period=args.period,
+                           workers=args.workers, image_format=args.image, resample=args.resample)
+    return 0 if all(status == "ok" for status in report.values()) else 1
+
+
+def cmd_backtest(args):
+    from backtest import backtest
+    result = backtest(_load_conditions(args), _symbols(args), horizons=args.horizons, start=args.start,
+                      end=args.end, entries_only=args.entries_only)
+    print(result["summary"].to_string())
+    if args.output:
+        result["trades"].to_csv(args.output, index=False)
+    return 0
+
+
+def cmd_fundamentals(args):
+    # One bulk refresh and a single write of the fundamentals table, however many symbols there are
+    from downloader import BulkDownloader
+    symbols = _symbols(args)
+    report = BulkDownloader(workers=args.workers, rate=args.rate).refresh(symbols, prices=False)
+    if args.print:
+        from tabulate import tabulate  # Only needed for printing, so it is imported here
+        table = fundamentals_store.load()
+        for symbol in symbols:
+            if report[symbol] == "ok" and symbol in table.index:
+                rows = [(key, "N/A" if pd.isna(value) else value) for key, value in table.loc[symbol].items()]
+                print(tabulate([("Symbol", symbol)] + rows, headers=["Metric", "Value"], tablefmt="fancy_grid"))
+    return 0 if all(status == "ok" for status in report.values()) else 1
+
+
+def _chart_options(parser):
+    parser.add_argument("--period", type=int, default=150, help="Days to show (0: the full history)")
+    parser.add_argument("--sma", type=int, nargs="+")
+    parser.add_argument("--ema", type=int, nargs="+")
+    parser.add_argument("--rsi", type=int)
+    parser.add_argument("--adx", type=int)
+    parser.add_argument("--macd", action="store_true")
+    parser.add_argument("--bollinger", action="store_true")
+    parser.add_argument("--resample", default="auto", choices=["auto", "D", "W", "M"],
+                        help="Candle size; auto switches to weekly or monthly above 1500 bars")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Download, scan and chart stock market data")
+    parser.add_argument("--profile", action="store_true", help="Time each stage and print a report at the end")
+    parser.add_argument("--top", type=int, default=10, help="Slowest symbols listed in the --profile report")
+    parser.add_argument("--cprofile", metavar="FILE", help="Run under cProfile and dump its stats to FILE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    download = commands.add_parser("download", help="Refresh prices and fundamentals")
+    download.add_argument("symbols", nargs="*", help="Symbols to refresh (default: every symbol in STOCK_N.py)")
+    download.add_argument("--workers", type=int, default=8)
+    download.add_argument("--rate", type=float, default=5.0, help="Provider requests per second")
+    download.add_argument("--no-prices", action="store_true")
+    download.add_argument("--no-fundamentals", action="store_true")
+    download.set_defaults(func=cmd_download)
+
+    scan = commands.add_parser("scan", help="Print the symbols matching a list of conditions")
+    scan.add_argument("symbols", nargs="*", help="Symbols to scan (default: every symbol in STOCK_N.py)")
+    scan.add_argument("-c", "--condition", action="append", help="One condition as a JSON object (repeatable)")
+    scan.add_argument("-f", "--file", help="JSON file holding a list of conditions")
+    scan.add_argument("--engine", choices=["symbol", "panel", "snapshot"], default="symbol")
+    scan.add_argument("--workers", type=int, default=None)
+    scan.add_argument("--table", action="store_true", help="Print each match's indicator values and checks")
+    scan.add_argument("--all", action="store_true", help="With --table/--output, include symbols that failed")
+    scan.add_argument("-o", "--output", help="Write the result table to this CSV file")
+    scan.set_defaults(func=cmd_scan)
+
+    chart = commands.add_parser("chart", help="Open an interactive chart for one symbol")
+    chart.add_argument("symbol")
+    _chart_options(chart)
+    chart.set_defaults(func=cmd_chart)
+
+    charts = commands.add_parser("charts", help="Write HTML charts for many symbols (or the matches of a scan)")
+    charts.add_argument("symbols", nargs="*", help="Symbols to chart (default: every symbol in STOCK_N.py)")
+    charts.add_argument("-c", "--condition", action="append", help="Only chart symbols matching this JSON condition")
+    charts.add_argument("-f", "--file", help="JSON file holding a list of conditions to filter by")
+    charts.add_argument("--engine", choices=["symbol", "panel", "snapshot"], default="panel")
+    charts.add_argument("--folder", default="charts", help="Output folder (index.html links every chart)")
+    charts.add_argument("--workers", type=int, default=None, help="Process pool size")
+    charts.add_argument("--image", metavar="FORMAT", help="Also save static images, e.g. png (needs kaleido)")
+    _chart_options(charts)
+    charts.set_defaults(func=cmd_charts)
+
+    backtest = commands.add_parser("backtest", help="Evaluate conditions on every past bar and measure what followed")
+    backtest.add_argument("symbols", nargs="*", help="Symbols to test (default: every symbol in STOCK_N.py)")
+    backtest.add_argument("-c", "--condition", action="append", help="One condition as a JSON object (repeatable)")
+    backtest.add_argument("-f", "--file", help="JSON file holding a list of conditions")
+    backtest.add_argument("--horizons", type=int, nargs="+", default=[1, 5, 20], help="Holding periods in bars")
+    backtest.add_argument("--start", help="First signal date, e.g. 2015-01-01")
+    backtest.add_argument("--end", help="Signals before this date only")
+    backtest.add_argument("--entries-only", action="store_true", help="Count only the first bar of consecutive signals")
+    backtest.add_argument("-o", "--output", help="Write every signal with its returns to this CSV file")
+    backtest.set_defaults(func=cmd_backtest)
+
+    fundamentals = commands.add_parser("fundamentals", help="Refresh fundamentals for some symbols")
+    fundamentals.add_argument("symbols", nargs="*", help="Symbols to refresh (default: every symbol in STOCK_N.py)")
+    fundamentals.add_argument("--workers", type=int, default=8)
+    fundamentals.add_argument("--rate", type=float, default=5.0, help="Provider requests per second")
+    fundamentals.add_argument("--print", action="store_true", help="Print each symbol's table")
+    fundamentals.set_defaults(func=cmd_fundamentals)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.profile:
+        instrument.enable()
+    with instrument.profile(args.cprofile) if args.cprofile else contextlib.nullcontext():
+        status = args.func(args)
+    if args.profile or instrument.enabled:
+        print(instrument.report(args.top))
+    return status
+
+
+if __name__ == "__main__":
+    # e.g. python main.py chart A1CAP.IS --period 150 --rsi 14 --ema 10 25 --macd
+    #      python main.py scan -c '{"type": "ta", "indicator": "ema", "case": 5, "condition": "cut_up", "con_v1": 20}'
+    #      python main.py scan -c '{"type": "fa", "financial ratio": "PE", "condition": "<", "con_v1": 10}'
+    sys.exit(main())
@@ -0,0 +1,212 @@
+import numpy as np
+import pandas as pd
+import kernels
+from storage import get_store, COLUMNS
+from fundamentals import fundamentals_store
+from conditions import compile_conditions, describe, min_bars, operand_column, operand_keys
+from instrument import timer
+
+
+def _shift(x):
+    # Previous row of a bars x symbols array, NaN on the first row
+    out = np.empty_like(x)
+    out[0] = np.nan
+    out[1:] = x[:-1]
+    return out
+
+
+def evaluate(condition, case, con_v1, con_v2):
+    # Apply a scan_ta comparison to bars x symbols operands (or scalars), returning one boolean per cell
+    kind = condition["condition"]
+    with np.errstate(invalid="ignore"):
+        if kind == ">":
+            return case >= con_v1
+        elif kind == "<":
+            return case <= con_v1
+        elif kind in ("cut_up", "cut_down"):
+            if np.ndim(case) == 0:
+                return np.zeros(1, dtype=bool)  # scan_ta returns False for non-Series values
+            prev_con = _shift(con_v1) if np.ndim(con_v1) else con_v1
+            if kind == "cut_up":
+                return (case >= con_v1) & (_shift(case) < prev_con)
+            return (case <= con_v1) & (_shift(case) > prev_con)
+        elif kind == "between":
+            lower = np.minimum(con_v1, con_v2)
+            upper = np.maximum(con_v1, con_v2)
+            return (lower <= case) & (case <= upper)
+        elif kind == "s_value":
+            return np.nan_to_num(case) != 0
+        elif kind == "g_intersection":
+            return (case != con_v1) & (case == 1)
+        elif kind == "b_intersection":
+            return (case != con_v1) & (case == 0)
+        else:
+            raise ValueError(f"Unsupported condition: {kind}")
+
+
+def scan_frame(plan, symbols, operand, lengths):
+    # Evaluate a compiled plan for many symbols at once and keep the values behind every decision.
+    # operand(key) gives a bars x symbols array (only its last two rows are used) or a scalar, and
+    # lengths holds each symbol's bar count. Returns a DataFrame indexed by symbol with the latest value
+    # of each distinct operand (EMA20, RSI14, a ratio such as PE, ...), one pass/fail column per
+    # condition labelled by conditions.describe, and "passed" for the whole list.
+    index = pd.Index(list(symbols), name="Symbol")
+    values = {}
+    checks = {}
+    for condition, keys in plan.steps:
+        label = describe(condition)
+        if label in checks:
+            label = f"{label} ({len(checks) + 1})"
+
+        if keys is None:
+            ratio = condition["financial ratio"]
+            table = fundamentals_store.load()
+            values[ratio] = table[ratio].reindex(index).to_numpy() if ratio in table else np.full(len(index), np.nan)
+            checks[label] = fundamentals_store.filter([condition], list(index)).to_numpy()
+            continue
+
+        operands = [operand(key) for key in keys]
+        need = max([min_bars(key) for key in keys if key[0] not in ("value", "last_price")] or [0])
+        last_two = [v[-2:] if np.ndim(v) else v for v in operands]
+        with np.errstate(invalid="ignore"):
+            result = np.broadcast_to(evaluate(condition, *last_two)[-1], lengths.shape)
+        checks[label] = result & (lengths >= need)
+        # con_v2 only matters to "between"; the -2 keys of crossover states are the same series one bar earlier
+        for key, value in zip(keys if condition["condition"] == "between" else keys[:2], operands):
+            if np.ndim(value) and not (key[0] in ("g_d_cross", "macd") and key[1] == -2):
+                values[operand_column(key)] = value[-1]
+
+    passed = np.ones(len(index), dtype=bool)
+    for ok in checks.values():
+        passed &= ok
+    # One DataFrame built from whole columns at once, never grown row by row
+    return pd.DataFrame({**values, **checks, "passed": passed}, index=index)
+
+
+class Panel:
+    # The whole universe as bars x symbols arrays, so each indicator is one NumPy pass over every symbol.
+    # Histories are right-aligned on their last bar: row -1 is every symbol's latest bar, and shorter
+    # histories are NaN-padded at the top, which keeps each column identical to the per-symbol Indicator.
+    def __init__(self, symbols, store=None, lookback=None):
+        # lookback limits every symbol to its most recent bars, e.g. ConditionPlan.lookback for a scan
+        self.store = store or get_store()
+        arrays = {}
+        for symbol in symbols:
+            try:
+                with timer("load", symbol):
+                    if lookback:
+                        df = self.store.read_tail(symbol, lookback)
+                        arrays[symbol] = {col: df[col].to_numpy() for col in COLUMNS}
+                    else:
+                        arrays[symbol] = self.store.read_arrays(symbol)
+            except FileNotFoundError:
+                print(f"Error: No price data found for {symbol}.")
+
+        self.symbols = list(arrays)
+        self.lengths = np.array([len(a["Date"]) for a in arrays.values()], dtype=np.int64)
+        bars = int(self.lengths.max()) if len(self.lengths) else 0
+
+        for col in COLUMNS:
+            fill = np.datetime64("NaT") if col == "Date" else np.nan
+            dtype = "datetime64[ns]" if col == "Date" else np.float64
+            panel = np.full((bars, len(self.symbols)), fill, dtype=dtype)
+            for j, a in enumerate(arrays.values()):
+                if len(a[col]):
+                    panel[bars - len(a[col]):, j] = a[col]
+            setattr(self, col.lower(), panel)
+
+        self._memo = {}
+
+    def _cached(self, key, compute):
+        if key not in self._memo:
+            with np.errstate(invalid="ignore", divide="ignore"), timer("panel.indicator"):
+                self._memo[key] = compute()
+        return self._memo[key]
+
+    def sma_indicator(self, period):
+        return self._cached(("sma", period), lambda: kernels.sma(self.close, period))
+
+    def ema_indicator(self, period):
+        return self._cached(("ema", period), lambda: kernels.ema(self.close, period))
+
+    def rsi_indicator(self, period=14):
+        return self._cached(("rsi", period), lambda: kernels.rsi(self.close, period))
+
+    def adx_indicator(self, period=14):
+        return self._cached(("adx", period), lambda: kernels.adx(self.high, self.low, self.close, period)[0])
+
+    def relative_vol(self, period=10):
+        return self._cached(("rel_vol", period), lambda: kernels.relative_volume(self.volume, period))
+
+    def golden_dead_cross(self):
+        # 1.0 where SMA50 is above SMA200 (Golden Cross), 0.0 otherwise
+        return self._cached("g_d_cross", lambda: (self.sma_indicator(50) > self.sma_indicator(200)).astype(np.float64))
+
+    def macd_indicator(self):
+        def compute():
+            macd = self.ema_indicator(12) - self.ema_indicator(26)
+            signal = kernels.ema(macd, 9)
+            return {"macd": macd, "macd_signal": signal, "histogram": macd - signal}
+        return self._cached("macd", compute)
+
+    def bollinger_bands(self):
+        def compute():
+            mid = self.sma_indicator(20)
+            std = kernels.rolling_std(self.close, 20)
+            return {"mid_band": mid, "upper_band": mid + 2 * std, "lower_band": mid - 2 * std}
+        return self._cached("bollinger", compute)
+
+    def operand(self, key):
+        # A conditions.operand_keys key as a bars x symbols array, or the literal for ("value", x)
+        kind = key[0]
+        if kind == "value":
+            return key[1]
+        elif kind == "last_price":
+            return self.close  # Last close instead of a quote request per symbol
+        elif kind == "sma":
+            return self.sma_indicator(key[1])
+        elif kind == "ema":
+            return self.ema_indicator(key[1])
+        elif kind == "rsi":
+            return self.rsi_indicator(key[1])
+        elif kind == "adx":
+            return self.adx_indicator(key[1])
+        elif kind == "rel_vol":
+            return self.relative_vol(key[1])
+        elif kind == "g_d_cross":
+            cross = self.golden_dead_cross()
+            return cross if key[1] == -1 else _shift(cross)
+        elif kind == "macd":
+            positive = self._cached("macd_positive", lambda: (self.macd_indicator()["histogram"] > 0).astype(np.float64))
+            return positive if key[1] == -1 else _shift(positive)
+        raise ValueError(f"Unsupported operand: {key}")
+
+    def scan_table(self, conditions):
+        # Like scan, but returns the DataFrame from scan_frame with every operand value and check
+        with timer("panel.scan_table"):
+            return scan_frame(compile_conditions(conditions), self.symbols, self.operand, self.lengths)
+
+    def scan_ta(self, condition):
+        # One boolean per symbol for the latest bar
+        keys = operand_keys(condition)
+        need = max([min_bars(key) for key in keys if key[0] not in ("value", "last_price")] or [0])
+        last_two = [v[-2:] if np.ndim(v) else v for v in (self.operand(key) for key in keys)]
+        with np.errstate(invalid="ignore"):
+            result = np.broadcast_to(evaluate(condition, *last_two)[-1], self.lengths.shape)
+        return result & (self.lengths >= need)
+
+    def scan(self, conditions):
+        # Same answer as calling Scan.scan per symbol, TA conditions evaluated for all symbols at once
+        plan = compile_conditions(conditions)
+        mask = np.ones(len(self.symbols), dtype=bool)
+        for condition, keys in plan.steps:
+            if keys is not None and len(self.symbols):
+                with timer("panel.scan_ta"):
+                    mask &= self.scan_ta(condition)
+
+        matches = [symbol for symbol, ok in zip(self.symbols, mask) if ok]
+        fa_conditions = [condition for condition, keys in plan.steps if keys is None]
+        if fa_conditions and matches:
+            passed = fundamentals_store.filter(fa_conditions, matches)
+            matches = [symbol for symbol, ok in zip(matches, passed.to_numpy()) if ok]
+        return matches
@@ -0,0 +1,79 @@
+import threading
+import pandas as pd
+from storage import COLUMNS, to_typed
+from instrument import timer, count
+
+
+class YFinanceProvider:
+    # Yahoo Finance through yfinance. Multi-ticker downloads go out as one request per batch.
+    batch_size = 50
+
+    def __init__(self):
+        # yf.download keeps its results in module-level state, so concurrent calls must not overlap
+        self._lock = threading.Lock()
+
+    def download(self, symbols, start=None, end=None, period=None):
+        # Returns {symbol: typed frame with Date, Close, High, Low, Open, Volume}
+        import yfinance as yf
+
+        kwargs = {"period": period} if period else {"start": start, "end": end}
+        count("download.symbols", len(symbols))
+        with self._lock, timer("download.prices"):
+            data = yf.download(list(symbols), group_by="ticker", progress=False, threads=False, **kwargs)
+
+        frames = {}
+        for symbol in symbols:
+            if data.empty or symbol not in data.columns.get_level_values(0):
+                continue
+            df = data[symbol].dropna(subset=["Close"]).reset_index()
+            if not df.empty:
+                frames[symbol] = to_typed(df)
+        return frames
+
+    def info(self, symbol):
+        import yfinance as yf
+        with timer("download.info", symbol):
+            return yf.Ticker(symbol).info
+
+
+class StubProvider:
+    # Offline provider serving prepared frames and info dicts, for tests and dry runs.
+    # Every request is counted in calls; symbols in failures raise on their first N requests.
+    batch_size = 50
+
+    def __init__(self, frames=None, infos=None, failures=None):
+        self.frames = {symbol: to_typed(df) for symbol, df in (frames or {}).items()}
+        self.infos = infos or {}
+        self.failures = dict(failures or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def _record(self, kind, symbols):
+        with self._lock:
+            self.calls.append((kind, tuple(symbols)))
+            for symbol in symbols:
+                if self.failures.get(symbol, 0) > 0:
+                    self.failures[symbol] -= 1
+                    raise ConnectionError(f"Stub failure for {symbol}")
+
+    def download(self, symbols, start=None, end=None, period=None):
+        self._record("download", symbols)
+        frames = {}
+        for symbol in symbols:
+            df = self.frames.get(symbol)
+            if df is None:
+                continue
+            if period:
+                df = df.tail(1)
+            else:
+                if start is not None:
+                    df = df[df["Date"] >= pd.Timestamp(start)]
+                if end is not None:
+                    df = df[df["Date"] < pd.Timestamp(end)]
+            if not df.empty:
+                frames[symbol] = df[COLUMNS].reset_index(drop=True)
+        return frames
+
+    def info(self, symbol):
+        self._record("info", [symbol])
+        return dict(self.infos.get(symbol, {}))
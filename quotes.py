@@ -0,0 +1,55 @@
+import os
+import time
+import threading
+import pandas as pd
+from cache import frame_cache
+from fundamentals import fundamentals_store
+
+# Seconds a quote is served from memory before it is read again from local data
+QUOTE_TTL = float(os.environ.get("MARKET_INFO_QUOTE_TTL", 900))
+
+
+class QuoteCache:
+    # Last price per symbol for conditions with an empty case, from local data only: the last close
+    # in the price store, or the "Last Price" of the fundamentals table for a symbol without price data.
+    # StockData puts the new last close whenever it writes bars. Nothing here makes a request or writes a file.
+    def __init__(self, ttl=QUOTE_TTL):
+        self.ttl = ttl
+        self._quotes = {}  # symbol: (price, time it was read)
+        self._lock = threading.Lock()
+
+    def get(self, symbol):
+        # None when there is no local price for the symbol
+        with self._lock:
+            quote = self._quotes.get(symbol)
+        if quote is not None and time.monotonic() - quote[1] < self.ttl:
+            return quote[0]
+        price = self._read(symbol)
+        if price is not None:
+            self.put(symbol, price)
+        return price
+
+    def put(self, symbol, price):
+        if price is not None and not pd.isna(price):
+            with self._lock:
+                self._quotes[symbol] = (float(price), time.monotonic())
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._quotes.clear()
+            else:
+                self._quotes.pop(symbol, None)
+
+    def _read(self, symbol):
+        if frame_cache.store.exists(symbol):
+            df = frame_cache.load_tail(symbol, 1)
+            if len(df):
+                return float(df["Close"].iloc[-1])
+        table = fundamentals_store.load()
+        if symbol in table.index and not pd.isna(table.at[symbol, "Last Price"]):
+            return float(table.at[symbol, "Last Price"])
+        return None
+
+
+quote_cache = QuoteCache()
@@ -1,5 +1,7 @@
 import pandas as pd
-import os
+from fundamentals import fundamentals_store
+from conditions import CROSSOVERS, compile_conditions, operand_keys, resolve
+from instrument import timer
 
 class Scan:
     def __init__(self, indicator, stock_data):
@@ -7,64 +9,15 @@ class Scan:
         self.stock_data = stock_data
 
     def scan_ta(self, condition):
-        result = []
-
-        # Check which indicator to use
-        if condition["indicator"] == "sma":
-            #This if else condition works when the case is sent empty in the dictionary, so that the case is the last price.
-            if condition["case"] == "":
-                case = self.stock_data.get_stock_data()["Last Price"]
-                con_v1 = self.indicator.sma_indicator(condition["con_v1"])
-                con_v2 = self.indicator.sma_indicator(condition.get("con_v2", 10))
-            else:
-                case = self.indicator.sma_indicator(condition["case"])
-                con_v1 = self.indicator.sma_indicator(condition["con_v1"])
-                con_v2 = self.indicator.sma_indicator(condition.get("con_v2", 10))
-
-        # Handle EMA indicator
-        elif condition["indicator"] == "ema":
-            if condition["case"] == "":
-                case = self.stock_data.get_stock_data()["Last Price"]
-                con_v1 = self.indicator.ema_indicator(condition["con_v1"])
-                con_v2 = self.indicator.ema_indicator(condition.get("con_v2", 10))
-            else:
-                case = self.indicator.ema_indicator(condition["case"])
-                con_v1 = self.indicator.ema_indicator(condition["con_v1"])
-                con_v2 = self.indicator.ema_indicator(condition.get("con_v2", 10))
-
-        # Handle RSI indicator
-        elif condition["indicator"] == "rsi":
-            case = self.indicator.rsi_indicator()
-            con_v1 = condition["con_v1"]
-            con_v2 = condition.get("con_v2", 10)
-
-        # Handle Relative Volume indicator
-        elif condition["indicator"] == "rel_vol":
-            case = self.indicator.relative_vol(condition.get("case", 10))
-            con_v1 = condition["con_v1"]
-            con_v2 = condition.get("con_v2", 1)
-
-        # Handle ADX indicator
-        elif condition["indicator"] == "adx":
-            case = self.indicator.adx_indicator(condition.get("case", 14))
-            con_v1 = condition["con_v1"]
-            con_v2 = condition.get("con_v2", 10)
-
-        # Handle Golden/Death Cross condition
-        elif condition["indicator"] == "g_d_cross":
-            case = self.indicator.golden_dead_cross()["Cross"].iloc[-1] == "Golden Cross"
-            con_v1 = self.indicator.golden_dead_cross()["Cross"].iloc[-2] == "Golden Cross"
-            con_v2 = 10
-        # Handle MACD indicator
-        elif condition["indicator"] == "macd":
-            case = self.indicator.macd_indicator()["signal"].iloc[-1] == "Positive Signal"
-            con_v1 = self.indicator.macd_indicator()["signal"].iloc[-2] == "Positive Signal"
-            con_v2 = 10
-
-        # Raise an error if the indicator is unsupported
-        else:
-            raise ValueError(f"Unsupported indicator type: {condition['indicator']}")
-
+        # Resolve the indicator values the condition compares, then apply the comparison
+        keys = operand_keys(condition)
+        memo = {}
+        crossover = condition["condition"] in CROSSOVERS
+        case, con_v1, con_v2 = (resolve(key, self, memo, crossover) for key in keys)
+        with timer("scan.compare", self.stock_data.symbol):
+            return self.compare(condition, case, con_v1, con_v2)
+
+    def compare(self, condition, case, con_v1, con_v2):
         # Function to extract the latest value from a Series or return the value itself
         def get_value(val):
             if isinstance(val, pd.Series):
@@ -109,7 +62,7 @@ class Scan:
             return lower <= case_val <= upper
 
         elif condition["condition"] == "s_value":
-            return case
+            return bool(case_val) and not pd.isna(case_val)
 
         elif condition["condition"] == "g_intersection":
             return case != con_v1 and case
@@ -123,43 +76,25 @@ class Scan:
         return False
 
     def scan_fa(self, condition):
-        file_path = "fundamental_analysis_stocks.csv"
+        # The fundamentals table is parsed once and shared by every symbol and condition
+        df = fundamentals_store.load()
 
         # Check if the fundamental analysis data file exists
-        if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        if df.empty:
             print(f"Error: Database is empty or not found ({self.stock_data.symbol})")
             return False
 
-        # Read the CSV file
-        try:
-            df = pd.read_csv(file_path, index_col="Symbol")  # Use "Symbol" column as index
-        except pd.errors.EmptyDataError:
-            print(f"Error: Data file is empty({self.stock_data.symbol})")
-            return False
-
         # If the stock is not found in the data, return an error
         if self.stock_data.symbol not in df.index:
             print(f"Error: No data found for {self.stock_data.symbol}.")
             return False
 
-        stock_data = df.loc[self.stock_data.symbol]
-
         # Check if the requested financial ratio exists and is valid
-        if condition["financial ratio"] not in stock_data or stock_data[condition["financial ratio"]] == "N/A":
+        if condition["financial ratio"] not in df.columns or pd.isna(df.at[self.stock_data.symbol, condition["financial ratio"]]):
             print(f"Error: {condition['financial ratio']} data is 'N/A' or not found ({self.stock_data.symbol}).")
             return False
 
-        value = stock_data[condition["financial ratio"]]
-
-        # Convert the value to a float, handling percentage signs if necessary
-        try:
-            if isinstance(value, str) and "%" in value:
-                value = float(value.replace("%", ""))
-            else:
-                value = float(value)
-        except ValueError:
-            print(f"Error: Could not convert {condition['financial ratio']} ({self.stock_data.symbol}).")
-            return False  # Return False if conversion fails
+        value = df.at[self.stock_data.symbol, condition["financial ratio"]]  # Already numeric
 
         # Apply financial condition checks
         if condition["condition"] == ">":
@@ -173,28 +108,7 @@ class Scan:
             return False
 
     def scan(self, conditions):
-        result = []
-        ta_conditions = []
-        fa_conditions = []
-
-        # Separate technical analysis (TA) and fundamental analysis (FA) conditions
-        for condition in conditions:
-            if condition["type"] == "fa":
-                fa_conditions.append(condition)
-            else:
-                ta_conditions.append(condition)
-
-        # Process TA conditions
-        for ta_condition in ta_conditions:
-            ta_result = self.scan_ta(ta_condition)
-            result.append(ta_result)
-
-        # Process FA conditions
-        for fa_condition in fa_conditions:
-            fa_result = self.scan_fa(fa_condition)
-            result.append(fa_result)
-
-        # If any condition fails, return False
-        if False in result:
-            return False
-        return True
+        # conditions is a list of condition dicts or a plan from compile_conditions; compiling once and
+        # passing the plan avoids re-validating the same list for every symbol
+        with timer("scan", self.stock_data.symbol):
+            return compile_conditions(conditions).evaluate(self)
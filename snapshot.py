@@ -0,0 +1,126 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+from cache import frame_cache
+from conditions import compile_conditions, operand_column
+from locks import FileLock
+from panel import scan_frame
+from state import DEFAULT_SPEC, update_state
+from storage import DEFAULT_FOLDER
+
+# In its own folder: CsvStore takes every .csv directly under datafolder for a symbol
+SNAPSHOT_FILE = os.path.join(DEFAULT_FOLDER, "snapshot", "latest.csv")
+
+
+# Columns a snapshot row holds, e.g. SMA50, EMA20, RSI14, plus the derived MACD and cross states
+_COVERED = ({f"SMA{p}" for p in DEFAULT_SPEC["SMA"]} | {f"EMA{p}" for p in DEFAULT_SPEC["EMA"]}
+            | {f"RSI{p}" for p in DEFAULT_SPEC["RSI"]} | {f"ADX{p}" for p in DEFAULT_SPEC["ADX"]}
+            | {f"REL_VOL{p}" for p in DEFAULT_SPEC["REL_VOL"]} | {"MACD_POSITIVE", "GOLDEN_CROSS", "CLOSE"})
+
+
+def _operand(table, key):
+    # 2 x symbols array [previous bar, latest bar], or a scalar for a literal value
+    if key[0] == "value":
+        return key[1]
+    if key[0] in ("macd", "g_d_cross"):
+        if key[0] == "macd":
+            latest, previous = table["HISTOGRAM"] > 0, table["HISTOGRAM_PREV"] > 0
+        else:
+            latest, previous = table["SMA50"] > table["SMA200"], table["SMA50_PREV"] > table["SMA200_PREV"]
+        rows = [previous, latest] if key[1] == -1 else [np.full(len(table), np.nan), previous]
+        return np.vstack([np.asarray(row, dtype=np.float64) for row in rows])
+    column = operand_column(key)
+    return np.vstack([table[f"{column}_PREV"].to_numpy(dtype=np.float64), table[column].to_numpy(dtype=np.float64)])
+
+
+def snapshot_row(symbol):
+    # Latest and previous bar values of the default indicator set for one symbol, from its
+    # incremental state (so only bars appended since the last refresh are processed)
+    previous, latest = update_state(symbol)
+    df = frame_cache.load(symbol)
+    row = {"Symbol": symbol, "Date": df["Date"].iloc[-1], "Bars": len(df),
+           "Signature": repr(frame_cache.store.signature(symbol))}
+    for key, value in latest.items():
+        row[key] = value
+        row[f"{key}_PREV"] = previous.get(key, float("nan"))
+    return row
+
+
+class SnapshotStore:
+    # Per-symbol table of the latest and previous values of common indicators, materialized after
+    # each download so screens need no price data at all. Rows are keyed by the stored price
+    # signature: a symbol whose data changed since its row was written is recomputed before use.
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = path
+        self._signature = None
+        self._table = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Table indexed by Symbol; empty when nothing was materialized yet
+        if not os.path.exists(self.path):
+            return pd.DataFrame(index=pd.Index([], name="Symbol"))
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if signature != self._signature:
+                self._table = pd.read_csv(self.path, parse_dates=["Date"]).set_index("Symbol")
+                self._signature = signature
+            return self._table
+
+    def upsert(self, rows):
+        # Replace the rows of these symbols in one atomic rewrite, as FundamentalsStore.upsert does
+        new = pd.DataFrame(list(rows))
+        if new.empty:
+            return self.load()
+        with FileLock(self.path):
+            new = new.drop_duplicates("Symbol", keep="last")
+            old = self.load().reset_index()
+            old = old[~old["Symbol"].isin(new["Symbol"])]
+            updated = pd.concat([old, new], ignore_index=True) if len(old) else new
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            updated.to_csv(tmp, index=False)
+            os.replace(tmp, self.path)
+        return self.load()
+
+    def refresh(self, symbols):
+        # Recompute the rows of symbols that are missing or whose price data changed; returns the table
+        table = self.load()
+        stale = []
+        for symbol in symbols:
+            if not frame_cache.store.exists(symbol):
+                continue
+            current = repr(frame_cache.store.signature(symbol))
+            if symbol not in table.index or table.at[symbol, "Signature"] != current:
+                stale.append(symbol)
+        if stale:
+            table = self.upsert(snapshot_row(symbol) for symbol in stale)
+        return table
+
+    def covers(self, conditions):
+        # True when every TA operand of the conditions is a column of the table
+        plan = compile_conditions(conditions)
+        return all(operand_column(key) in _COVERED for key in plan.requirements)
+
+    def scan_table(self, conditions, symbols):
+        # Every operand value and check per symbol (see panel.scan_frame), from the table alone
+        plan = compile_conditions(conditions)
+        missing = [key for key in plan.requirements if operand_column(key) not in _COVERED]
+        if missing:
+            raise ValueError(f"The snapshot table does not hold {missing}; use the symbol or panel engine")
+
+        table = self.refresh(symbols).reindex([symbol for symbol in symbols if frame_cache.store.exists(symbol)])
+        if not len(table):
+            return pd.DataFrame({"passed": np.zeros(0, dtype=bool)}, index=pd.Index([], name="Symbol"))
+        return scan_frame(plan, table.index, lambda key: _operand(table, key), table["Bars"].to_numpy())
+
+    def scan(self, conditions, symbols):
+        # Same answer as Panel.scan (including the last close for an empty case)
+        frame = self.scan_table(conditions, symbols)
+        return list(frame.index[frame["passed"].to_numpy()])
+
+
+snapshot_store = SnapshotStore()
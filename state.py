@@ -0,0 +1,259 @@
+import os
+import json
+import copy
+import math
+import pandas as pd
+from cache import frame_cache
+from storage import DEFAULT_FOLDER
+
+DEFAULT_SPEC = {
+    "SMA": [5, 10, 20, 50, 100, 200],
+    "EMA": [5, 10, 12, 20, 26, 50, 100, 200],
+    "RSI": [14],
+    "ADX": [14],
+    "REL_VOL": [10],
+}
+NAN = float("nan")
+# Bumped whenever the saved layout changes; states of another version are rebuilt from the history
+STATE_VERSION = 2
+
+
+def _ewm_step(acc, x, alpha):
+    # One step of ewm(adjust=False) as pandas and kernels.ema compute it; acc is [value, weight].
+    # Starts at the first valid value; across missing values the previous value's weight keeps decaying.
+    if math.isnan(acc[0]):
+        acc[0] = x
+    else:
+        acc[1] *= 1.0 - alpha
+        if not math.isnan(x):
+            acc[0] = (acc[1] * acc[0] + alpha * x) / (acc[1] + alpha)
+            acc[1] = 1.0
+    return acc[0]
+
+
+def _rma_step(acc, x, period):
+    # One step of ewm(alpha=1/period, adjust=True, min_periods=period); acc is [numerator, denominator, count]
+    decay = 1.0 - 1.0 / period
+    if math.isnan(x):
+        if acc[2] > 0:
+            acc[0] *= decay
+            acc[1] *= decay
+    else:
+        acc[0] = acc[0] * decay + x
+        acc[1] = acc[1] * decay + 1.0
+        acc[2] += 1
+    return acc[0] / acc[1] if acc[2] >= period and acc[1] else NAN
+
+
+def _div(a, b):
+    return a / b if b and not math.isnan(b) else NAN
+
+
+def _mean(values):
+    return NAN if any(math.isnan(v) for v in values) else sum(values) / len(values)
+
+
+class IndicatorState:
+    # Recursive indicator state for one symbol, advanced bar by bar.
+    # EMAs and Wilder averages keep their running values; SMA, Bollinger and relative volume
+    # are read from the tail of recent closes and volumes, which is all a rolling window needs.
+    def __init__(self, spec=None):
+        self.spec = spec or DEFAULT_SPEC
+        self.version = STATE_VERSION
+        self.date = None
+        self.bars = 0
+        self.close = NAN  # Close of the last processed bar, used to detect rewritten history
+        self.prev = None  # (high, low, close) of the last processed bar
+        self.closes = []
+        self.volumes = []
+        self.ema = {str(p): [NAN, 1.0] for p in set(self.spec["EMA"]) | {12, 26}}
+        self.macd_signal = [NAN, 1.0]
+        self.rsi = {str(p): [[0.0, 0.0, 0], [0.0, 0.0, 0]] for p in self.spec["RSI"]}
+        self.adx = {str(p): [[0.0, 0.0, 0] for _ in range(4)] for p in self.spec["ADX"]}
+        self.values = {}
+
+    def _tail(self):
+        return max(self.spec["SMA"] + self.spec["REL_VOL"] + [20])
+
+    def advance(self, df):
+        # Feed new bars (Date, Close, High, Low, Volume) in order
+        for date, close, high, low, volume in zip(df["Date"], df["Close"], df["High"], df["Low"], df["Volume"]):
+            prev_high, prev_low, prev_close = self.prev or (NAN, NAN, NAN)
+
+            for period in self.ema:
+                _ewm_step(self.ema[period], close, 2.0 / (int(period) + 1))
+            _ewm_step(self.macd_signal, self.ema["12"][0] - self.ema["26"][0], 2.0 / 10)
+
+            diff = close - prev_close
+            for period, (pos, neg) in self.rsi.items():
+                p = _rma_step(pos, diff if math.isnan(diff) else max(diff, 0.0), int(period))
+                n = _rma_step(neg, diff if math.isnan(diff) else max(-diff, 0.0), int(period))
+                self.values[f"RSI{period}"] = 100 * _div(p, p + n)
+
+            ranges = [high - low, abs(high - prev_close), abs(low - prev_close)]
+            true_range = NAN if any(math.isnan(r) for r in ranges) else max(ranges)
+            up, down = high - prev_high, prev_low - low
+            if math.isnan(up) or math.isnan(down):
+                pos_dm = neg_dm = NAN
+            else:
+                pos_dm = up if up > down and up > 0 else 0.0
+                neg_dm = down if down > up and down > 0 else 0.0
+            for period, (tr_acc, pos_acc, neg_acc, dx_acc) in self.adx.items():
+                k = _div(100.0, _rma_step(tr_acc, true_range, int(period)))
+                dmp = k * _rma_step(pos_acc, pos_dm, int(period))
+                dmn = k * _rma_step(neg_acc, neg_dm, int(period))
+                self.values[f"ADX{period}"] = _rma_step(dx_acc, 100 * _div(abs(dmp - dmn), dmp + dmn), int(period))
+
+            self.closes = (self.closes + [close])[-self._tail():]
+            self.volumes = (self.volumes + [float(volume)])[-self._tail():]
+            self.prev = (high, low, close)
+            self.close = close
+            self.date = pd.Timestamp(date).strftime("%Y-%m-%d")
+            self.bars += 1
+
+        self._refresh_values()
+        return self
+
+    def _refresh_values(self):
+        # Latest values, NaN where the history is shorter than Indicator would accept
+        values = {key: v for key, v in self.values.items() if key.startswith(("RSI", "ADX"))}
+        for key in list(values):
+            if self.bars < int(key[3:]):
+                values[key] = NAN
+        for period in self.spec["SMA"]:
+            values[f"SMA{period}"] = _mean(self.closes[-period:]) if self.bars >= period else NAN
+        for period in self.spec["EMA"]:
+            values[f"EMA{period}"] = self.ema[str(period)][0] if self.bars >= period else NAN
+        for period in self.spec["REL_VOL"]:
+            values[f"REL_VOL{period}"] = _div(self.volumes[-1], _mean(self.volumes[-period:])) if self.bars >= period else NAN
+
+        macd = self.ema["12"][0] - self.ema["26"][0]
+        values["MACD"] = macd if self.bars > 26 else NAN
+        values["MACD_SIGNAL"] = self.macd_signal[0] if self.bars > 26 else NAN
+        values["HISTOGRAM"] = values["MACD"] - values["MACD_SIGNAL"]
+
+        if self.bars >= 20:
+            window = self.closes[-20:]
+            mid = _mean(window)
+            std = math.sqrt(sum((c - mid) ** 2 for c in window) / 19) if not math.isnan(mid) else NAN
+            values.update({"BB_MID": mid, "BB_UPPER": mid + 2 * std, "BB_LOWER": mid - 2 * std})
+        values["CLOSE"] = self.close
+        self.values = values
+
+    def matches(self, df):
+        # The first bar of df is this state's last bar, unchanged (the history wasn't rewritten)
+        return self.date is not None and len(df) > 0 and df["Date"].iloc[0] == pd.Timestamp(self.date) \
+            and math.isclose(df["Close"].iloc[0], self.close, rel_tol=1e-12)
+
+    def to_json(self):
+        return json.dumps(self.__dict__)
+
+    @classmethod
+    def from_json(cls, text):
+        state = cls.__new__(cls)
+        state.__dict__.update(json.loads(text))
+        state.prev = tuple(state.prev) if state.prev else None
+        return state
+
+
+class StateStore:
+    # One JSON file per symbol under datafolder/state/
+    def __init__(self, folder=DEFAULT_FOLDER):
+        self.folder = os.path.join(folder, "state")
+
+    def path(self, symbol):
+        return os.path.join(self.folder, f"{symbol}.json")
+
+    def load(self, symbol):
+        try:
+            with open(self.path(symbol)) as f:
+                return IndicatorState.from_json(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def discard(self, symbol):
+        # Drop a symbol's state, e.g. after bars were inserted into the middle of its history
+        try:
+            os.remove(self.path(symbol))
+        except FileNotFoundError:
+            pass
+
+    def save(self, symbol, state):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = self.path(symbol) + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(state.to_json())
+        os.replace(tmp, self.path(symbol))
+
+
+def update_state(symbol, spec=None, states=None):
+    # Advance the persisted state by the bars appended since the last update and return
+    # (previous bar values, latest bar values). The state is saved one bar short of the end,
+    # because the next download replaces the last bar when it was a partial session.
+    # Only the bars from the state's last bar on are read, from the end of the stored history.
+    states = states or StateStore()
+    state = states.load(symbol)
+    df = None
+    if state is not None and state.date is not None and getattr(state, "version", 1) == STATE_VERSION \
+            and state.spec == (spec or DEFAULT_SPEC):
+        df = _bars_since(symbol, state.date)
+        if len(df) < 2 or not state.matches(df):
+            df = None  # History was rewritten (e.g. dividend adjustment)
+    if df is None:
+        state = IndicatorState(spec)  # First run, or the saved state can't be continued
+        df = frame_cache.load(symbol)
+        confirmed = df.iloc[:-1]
+    else:
+        confirmed = df.iloc[1:-1]  # The first row is the state's own last bar
+
+    state.advance(confirmed)
+    states.save(symbol, state)
+
+    latest = copy.deepcopy(state).advance(df.iloc[-1:])
+    return state.values, latest.values
+
+
+def _bars_since(symbol, date, bars=8):
+    # Stored bars dated on or after date, read as a tail that grows until it reaches back to date
+    while True:
+        df = frame_cache.load_tail(symbol, bars)
+        if len(df) < bars or df["Date"].iloc[0] <= pd.Timestamp(date):
+            return df[df["Date"] >= pd.Timestamp(date)].reset_index(drop=True)
+        bars *= 4
+
+
+def verify_state(symbol, tolerance=1e-8, states=None):
+    # Compare incremental values with a full recompute through Indicator; returns the mismatches
+    from Indicator import Indicator
+
+    _, latest = update_state(symbol, states=states)
+    indicator = Indicator(symbol)
+
+    def last(series):
+        return NAN if series is None else float(series.iloc[-1])
+
+    full = {"RSI14": last(indicator.rsi_indicator(14)), "ADX14": last(indicator.adx_indicator(14)),
+            "REL_VOL10": last(indicator.relative_vol(10))}
+    for period in DEFAULT_SPEC["SMA"]:
+        full[f"SMA{period}"] = last(indicator.sma_indicator(period))
+    for period in DEFAULT_SPEC["EMA"]:
+        full[f"EMA{period}"] = last(indicator.ema_indicator(period))
+    macd = indicator.macd_indicator()
+    if macd is not None:
+        full.update({"MACD": last(macd["macd"]), "MACD_SIGNAL": last(macd["macd_signal"])})
+    bands = indicator.bollinger_bands()
+    if bands is not None:
+        full.update({"BB_MID": last(bands["mid_band"]), "BB_UPPER": last(bands["upper_band"]),
+                     "BB_LOWER": last(bands["lower_band"])})
+
+    mismatches = {}
+    for key, expected in full.items():
+        got = latest.get(key, NAN)
+        if math.isnan(expected) and math.isnan(got):
+            continue
+        if not math.isclose(got, expected, rel_tol=tolerance, abs_tol=tolerance):
+            mismatches[key] = (got, expected)
+
+    if mismatches:
+        print(f"Incremental state for {symbol} disagrees with a full recompute: {mismatches}")
+    return mismatches
@@ -0,0 +1,401 @@
+import io
+import os
+import sqlite3
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from locks import FileLock
+
+COLUMNS = ["Date", "Close", "High", "Low", "Open", "Volume"]
+PRICE_COLUMNS = ["Close", "High", "Low", "Open", "Volume"]
+DEFAULT_FOLDER = "./datafolder"
+
+
+def to_typed(df):
+    # Normalize a price frame to datetime64 dates, float64 OHLC and int64 volume
+    df = df[COLUMNS].copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce").astype("datetime64[ns]")
+    for col in ["Close", "High", "Low", "Open"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    df["Volume"] = pd.to_numeric(df["Volume"], errors="coerce").fillna(0).astype("int64")
+    # Rows without a parseable date are header debris from multi-ticker downloads
+    return df.dropna(subset=["Date"]).reset_index(drop=True)
+
+
+def _between(df, start=None, end=None):
+    # Rows with start <= Date < end; either bound may be omitted
+    if start is not None:
+        df = df[df["Date"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["Date"] < pd.Timestamp(end)]
+    return df.reset_index(drop=True)
+
+
+def _splice(old, new):
+    # Stored bars before the first new date, followed by the new bars
+    return pd.concat([old[old["Date"] < new["Date"].min()], new], ignore_index=True)
+
+
+class CsvStore:
+    # Text CSV per symbol, the original datafolder layout.
+    # Readers hold a shared lock on the file and writers an exclusive one, so an append is never read half-done.
+    name = "csv"
+
+    def __init__(self, folder=DEFAULT_FOLDER):
+        self.folder = folder
+
+    def path(self, symbol):
+        return os.path.join(self.folder, f"{symbol}.csv")
+
+    def exists(self, symbol):
+        return os.path.exists(self.path(symbol))
+
+    def signature(self, symbol):
+        stat = os.stat(self.path(symbol))
+        return stat.st_mtime_ns, stat.st_size
+
+    def symbols(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(f[:-4] for f in os.listdir(self.folder) if f.endswith(".csv"))
+
+    def read(self, symbol, start=None, end=None):
+        with FileLock(self.path(symbol), shared=True):
+            df = pd.read_csv(self.path(symbol))
+        return _between(to_typed(df), start, end)
+
+    def read_arrays(self, symbol, start=None, end=None):
+        df = self.read(symbol, start, end)
+        return {col: df[col].to_numpy() for col in COLUMNS}
+
+    def read_tail(self, symbol, bars):
+        # Parse only the last `bars` lines, reading the file backwards from its end
+        with FileLock(self.path(symbol), shared=True), open(self.path(symbol), "rb") as f:
+            header = f.readline()
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            data = b""
+            while pos > len(header) and data.count(b"\n") <= bars:
+                step = min(1 << 16, pos - len(header))
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = data.splitlines()[-bars:]
+        return to_typed(pd.read_csv(io.BytesIO(b"\n".join([header.rstrip()] + lines))))
+
+    def write(self, symbol, df):
+        os.makedirs(self.folder, exist_ok=True)
+        df = to_typed(df)
+        df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
+        tmp = self.path(symbol) + ".tmp"
+        with FileLock(self.path(symbol)):
+            df.to_csv(tmp, index=False)
+            os.replace(tmp, self.path(symbol))
+
+    def append(self, symbol, df):
+        # Write only the new bars: stored lines dated on or after the first new bar (a corrected last
+        # bar, or a line torn by an interrupted append) are cut off the end of the file and the new
+        # lines appended, so a daily update touches a few hundred bytes instead of the whole history
+        df = to_typed(df)
+        if df.empty:
+            return
+        if not self.exists(symbol):
+            return self.write(symbol, df)
+        first = df["Date"].min().strftime("%Y-%m-%d").encode()
+        df["Date"] = df["Date"].dt.strftime("%Y-%m-%d")
+        rows = df.to_csv(index=False, header=False).encode()
+        with FileLock(self.path(symbol)), open(self.path(symbol), "r+b") as f:
+            cut = self._cut(f, len(f.readline()), first)
+            f.seek(cut)
+            f.truncate()
+            f.write(rows)
+
+    def _cut(self, f, start, first):
+        # Offset of the first line dated on or after `first` (ISO dates sort as bytes), or of the
+        # incomplete last line if there is none; lines are read backwards from the end like read_tail
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > start:
+            step = min(1 << 16, pos - start)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            # Stop once a complete line older than `first` is in data; every line before it is older too
+            head = data.find(b"\n") + 1 if pos > start else 0
+            if head < len(data) and data[head:head + 10] < first:
+                break
+        offset = pos + (data.find(b"\n") + 1 if pos > start else 0)
+        lines = data[offset - pos:].split(b"\n")
+        for line in lines[:-1]:
+            if line[:10] >= first:
+                return offset
+            offset += len(line) + 1
+        return offset
+
+
+class NpyStore:
+    # One memory-mapped .npy file per column under datafolder/npy/<symbol>/.
+    # read_arrays hands out the mapped arrays directly, so nothing is parsed or copied.
+    # The columns are replaced one by one, so readers and writers take the symbol's lock as CsvStore does:
+    # every column of a read comes from the same write.
+    name = "npy"
+
+    def __init__(self, folder=DEFAULT_FOLDER):
+        self.folder = os.path.join(folder, "npy")
+
+    def path(self, symbol):
+        return os.path.join(self.folder, symbol)
+
+    def exists(self, symbol):
+        return os.path.exists(os.path.join(self.path(symbol), "Date.npy"))
+
+    def signature(self, symbol):
+        # Date.npy is written last, so its stat changes with every complete write
+        stat = os.stat(os.path.join(self.path(symbol), "Date.npy"))
+        return stat.st_mtime_ns, stat.st_size
+
+    def symbols(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(s for s in os.listdir(self.folder) if self.exists(s))
+
+    def read_arrays(self, symbol, start=None, end=None):
+        if not self.exists(symbol):
+            raise FileNotFoundError(f"No such symbol in npy store: {symbol}")
+        with FileLock(self.path(symbol), shared=True):
+            arrays = {col: np.load(os.path.join(self.path(symbol), f"{col}.npy"), mmap_mode="r") for col in COLUMNS}
+        if start is None and end is None:
+            return arrays
+        # Dates are sorted, so a range is a binary search and a slice of the mapped arrays
+        dates = arrays["Date"]
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), "left")
+        hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), "left")
+        return {col: a[lo:hi] for col, a in arrays.items()}
+
+    def read(self, symbol, start=None, end=None):
+        return pd.DataFrame(self.read_arrays(symbol, start, end), columns=COLUMNS)
+
+    def read_tail(self, symbol, bars):
+        arrays = self.read_arrays(symbol)
+        return pd.DataFrame({col: a[-bars:] for col, a in arrays.items()}, columns=COLUMNS)
+
+    def write(self, symbol, df):
+        os.makedirs(self.path(symbol), exist_ok=True)
+        df = to_typed(df)
+        with FileLock(self.path(symbol)):
+            for col in PRICE_COLUMNS + ["Date"]:
+                target = os.path.join(self.path(symbol), f"{col}.npy")
+                with open(target + ".tmp", "wb") as f:
+                    np.save(f, df[col].to_numpy())
+                os.replace(target + ".tmp", target)
+
+    def append(self, symbol, df):
+        # .npy files have a fixed length in their header, so new bars mean rewriting the columns
+        df = to_typed(df)
+        with FileLock(self.path(symbol)):
+            self.write(symbol, _splice(self.read(symbol), df) if self.exists(symbol) else df)
+
+
+class FeatherStore:
+    # Arrow/Feather file per symbol, memory-mapped on read. Needs pyarrow.
+    name = "feather"
+
+    def __init__(self, folder=DEFAULT_FOLDER):
+        self.folder = os.path.join(folder, "feather")
+
+    def path(self, symbol):
+        return os.path.join(self.folder, f"{symbol}.feather")
+
+    def exists(self, symbol):
+        return os.path.exists(self.path(symbol))
+
+    def signature(self, symbol):
+        stat = os.stat(self.path(symbol))
+        return stat.st_mtime_ns, stat.st_size
+
+    def symbols(self):
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(f[:-8] for f in os.listdir(self.folder) if f.endswith(".feather"))
+
+    def read(self, symbol, start=None, end=None):
+        return _between(pd.read_feather(self.path(symbol), memory_map=True), start, end)
+
+    def read_arrays(self, symbol, start=None, end=None):
+        df = self.read(symbol, start, end)
+        return {col: df[col].to_numpy() for col in COLUMNS}
+
+    def read_tail(self, symbol, bars):
+        return self.read(symbol).tail(bars).reset_index(drop=True)
+
+    def write(self, symbol, df):
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = self.path(symbol) + ".tmp"
+        # Uncompressed so the file can be memory-mapped without decoding
+        to_typed(df).to_feather(tmp, compression="uncompressed")
+        os.replace(tmp, self.path(symbol))
+
+    def append(self, symbol, df):
+        # Feather has no in-place append, so new bars mean rewriting the file
+        df = to_typed(df)
+        self.write(symbol, _splice(self.read(symbol), df) if self.exists(symbol) else df)
+
+
+def connect_sqlite(path):
+    # One connection per thread and process; WAL lets readers continue while a refresher writes
+    key = (path, os.getpid(), threading.get_ident())
+    conn = _connections.get(key)
+    if conn is None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _connections[key] = conn
+    return conn
+
+
+_connections = {}
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL, high REAL, low REAL, open REAL,
+    volume INTEGER,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+
+class SqliteStore:
+    # All symbols in one SQLite file, keyed by (symbol, date) so windows are index range scans.
+    # Each write bumps a per-symbol version, which is what the frame cache compares.
+    name = "sqlite"
+
+    def __init__(self, folder=DEFAULT_FOLDER):
+        self.folder = folder
+        self.db_path = os.path.join(folder, "market.db")
+
+    def _conn(self):
+        return connect_sqlite(self.db_path)
+
+    def path(self, symbol):
+        return f"{self.db_path}#{symbol}"
+
+    def exists(self, symbol):
+        row = self._conn().execute("SELECT 1 FROM versions WHERE name = ?", (f"prices:{symbol}",)).fetchone()
+        return row is not None
+
+    def signature(self, symbol):
+        row = self._conn().execute("SELECT version FROM versions WHERE name = ?", (f"prices:{symbol}",)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No such symbol in sqlite store: {symbol}")
+        return row
+
+    def symbols(self):
+        rows = self._conn().execute("SELECT substr(name, 8) FROM versions WHERE name LIKE 'prices:%' ORDER BY name")
+        return [row[0] for row in rows]
+
+    def read(self, symbol, start=None, end=None):
+        query = "SELECT date, close, high, low, open, volume FROM prices WHERE symbol = ?"
+        params = [symbol]
+        if start is not None:
+            query += " AND date >= ?"
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            query += " AND date < ?"
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        rows = self._conn().execute(query + " ORDER BY date", params).fetchall()
+        if not rows and not self.exists(symbol):
+            raise FileNotFoundError(f"No such symbol in sqlite store: {symbol}")
+        return to_typed(pd.DataFrame(rows, columns=COLUMNS))
+
+    def read_arrays(self, symbol, start=None, end=None):
+        df = self.read(symbol, start, end)
+        return {col: df[col].to_numpy() for col in COLUMNS}
+
+    def read_tail(self, symbol, bars):
+        rows = self._conn().execute(
+            "SELECT date, close, high, low, open, volume FROM prices WHERE symbol = ? ORDER BY date DESC LIMIT ?",
+            (symbol, bars)).fetchall()
+        if not rows and not self.exists(symbol):
+            raise FileNotFoundError(f"No such symbol in sqlite store: {symbol}")
+        return to_typed(pd.DataFrame(rows[::-1], columns=COLUMNS))
+
+    def write(self, symbol, df):
+        self.write_many({symbol: df})
+
+    def write_many(self, frames):
+        # Replace the history of several symbols in one transaction
+        self._replace({symbol: (df, None) for symbol, df in frames.items()})
+
+    def append(self, symbol, df):
+        # Only the new bars are inserted; stored bars from their first date on are replaced
+        df = to_typed(df)
+        if not df.empty:
+            self._replace({symbol: (df, df["Date"].min().strftime("%Y-%m-%d"))})
+
+    def _replace(self, frames):
+        # {symbol: (bars, first date to replace from, or None for the whole history)}
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for symbol, (df, since) in frames.items():
+                df = to_typed(df)
+                if since is None:
+                    conn.execute("DELETE FROM prices WHERE symbol = ?", (symbol,))
+                else:
+                    conn.execute("DELETE FROM prices WHERE symbol = ? AND date >= ?", (symbol, since))
+                conn.executemany(
+                    "INSERT INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    zip([symbol] * len(df), df["Date"].dt.strftime("%Y-%m-%d"), df["Close"].tolist(),
+                        df["High"].tolist(), df["Low"].tolist(), df["Open"].tolist(), df["Volume"].tolist()))
+                conn.execute("INSERT INTO versions VALUES (?, 1) "
+                             "ON CONFLICT(name) DO UPDATE SET version = version + 1", (f"prices:{symbol}",))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+STORES = {"csv": CsvStore, "npy": NpyStore, "feather": FeatherStore, "sqlite": SqliteStore}
+
+
+def get_store(kind=None, folder=DEFAULT_FOLDER):
+    # The backend defaults to MARKET_INFO_STORE, falling back to the CSV layout
+    kind = kind or os.environ.get("MARKET_INFO_STORE", "csv")
+    if kind not in STORES:
+        raise ValueError(f"Unsupported storage backend: {kind}")
+    return STORES[kind](folder)
+
+
+def migrate(source, target, symbols=None):
+    # Copy every symbol from one backend to another, e.g. the CSV folder to npy
+    done, failed = [], []
+    for symbol in symbols or source.symbols():
+        try:
+            target.write(symbol, source.read(symbol))
+            done.append(symbol)
+        except Exception as e:
+            print(f"Could not migrate {symbol}: {e}")
+            failed.append(symbol)
+
+    print(f"Migrated {len(done)} symbols from {source.name} to {target.name}, {len(failed)} failed.")
+    return done, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the price data folder between storage backends")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--from", dest="source", default="csv", choices=sorted(STORES))
+    parser.add_argument("--to", dest="target", default="npy", choices=sorted(STORES))
+    parser.add_argument("--folder", default=DEFAULT_FOLDER)
+    args = parser.parse_args()
+
+    migrate(get_store(args.source, args.folder), get_store(args.target, args.folder))
@@ -0,0 +1,131 @@
+import os
+import json
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from cache import frame_cache
+from locks import FileLock
+from storage import DEFAULT_FOLDER
+
+FIRST_DATE = "2000-01-03"
+MANIFEST_FILE = os.path.join(DEFAULT_FOLDER, "manifest.json")
+# Runs of more missing weekdays than this inside a history are treated as gaps to backfill;
+# shorter ones are holidays
+GAP_DAYS = 5
+
+
+def _day(value):
+    return pd.Timestamp(value).normalize()
+
+
+def expected_last_bar(now=None):
+    # Latest session that must be complete by now: the last weekday before today
+    return _day(now or datetime.now()) - pd.offsets.BDay(1)
+
+
+def find_gaps(dates, min_days=GAP_DAYS):
+    # (first missing day, day of the next stored bar) for every run of more than min_days missing weekdays
+    days = np.asarray(dates, dtype="datetime64[D]")
+    if len(days) < 2:
+        return []
+    missing = np.busday_count(days[:-1] + 1, days[1:])
+    return [(pd.Timestamp(days[i] + 1), pd.Timestamp(days[i + 1])) for i in np.flatnonzero(missing > min_days)]
+
+
+class Manifest:
+    # Per-symbol sync bookkeeping in datafolder/manifest.json:
+    #   last_confirmed   date of the newest bar that can no longer change (any bar before the fetch day)
+    #   checked_through  the expected last session when the symbol was last synced; while it still
+    #                    equals expected_last_bar() the symbol is current and needs no request
+    #   known_gaps       gaps a backfill already asked for and found empty (halts, suspensions)
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._entries = None
+        self._changed = {}
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, symbol):
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            return self._entries.get(symbol)
+
+    def update(self, symbol, entry):
+        # Kept in memory until save(), so a bulk refresh writes the manifest once
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read()
+            self._entries[symbol] = entry
+            self._changed[symbol] = entry
+
+    def save(self):
+        # Merge this process's changes into the file as it is now, so concurrent syncs don't drop entries
+        with self._lock:
+            if not self._changed:
+                return
+            with FileLock(self.path):
+                entries = self._read()
+                entries.update(self._changed)
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(entries, f, indent=1, sort_keys=True)
+                os.replace(tmp, self.path)
+            self._entries = entries
+            self._changed = {}
+
+
+def sync_plan(symbol, manifest, now=None, force=False):
+    # What a sync of symbol must download: {"start": first day of the tail to fetch, or None when the
+    # symbol is current; "gaps": [(start, end)] ranges missing inside the stored history}.
+    # A current symbol is answered from the manifest and a stat of its data, without reading it.
+    store = frame_cache.store
+    if not store.exists(symbol):
+        return {"start": _day(FIRST_DATE), "gaps": []}
+
+    entry = manifest.get(symbol) or {}
+    if (not force and entry.get("checked_through") == str(expected_last_bar(now).date())
+            and entry.get("signature") == repr(store.signature(symbol))):
+        return {"start": None, "gaps": []}
+
+    dates = frame_cache.load(symbol)["Date"]
+    known = {tuple(gap) for gap in entry.get("known_gaps", [])}
+    gaps = [gap for gap in find_gaps(dates) if (str(gap[0].date()), str(gap[1].date())) not in known]
+
+    # Without a manifest entry (e.g. data from before the manifest existed) every stored bar before
+    # today is taken as confirmed. Fetching starts the day after the last confirmed bar, so a partial
+    # bar from an earlier run is downloaded again and replaced
+    today = _day(now or datetime.now())
+    confirmed = dates[dates < today]
+    last = confirmed.max() if len(confirmed) else None
+    if last is not None and entry.get("last_confirmed"):
+        last = min(last, _day(entry["last_confirmed"]))
+    return {"start": _day(FIRST_DATE) if last is None else last + pd.Timedelta(days=1), "gaps": gaps}
+
+
+def record_sync(symbol, manifest, now=None, empty_gaps=()):
+    # Refresh symbol's manifest entry from its stored data after a successful sync
+    entry = dict(manifest.get(symbol) or {})
+    df = frame_cache.load(symbol)
+    confirmed = df["Date"][df["Date"] < _day(now or datetime.now())]
+    known = entry.get("known_gaps", []) + [[str(start.date()), str(end.date())] for start, end in empty_gaps]
+    entry.update({
+        "last_confirmed": str(confirmed.max().date()) if len(confirmed) else None,
+        "checked_through": str(expected_last_bar(now).date()),
+        "signature": repr(frame_cache.store.signature(symbol)),
+        "bars": len(df),
+        "known_gaps": known,
+    })
+    manifest.update(symbol, entry)
+    return entry
+
+
+manifest = Manifest()